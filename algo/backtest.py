@@ -0,0 +1,133 @@
+"""Rolling-origin backtest of the forecasting models over all stores and forecast weeks.
+
+Usage (from the repository root):
+
+    python -m algo.backtest --workers 8  # metrics written to backtest_metrics.parquet next to the sales data
+"""
+
+import argparse
+import datetime as dt
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Sequence
+
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from threadpoolctl import threadpool_limits
+
+from algo.feature_store import ensure_feature_store
+from algo.forecast import business_features
+from algo.registry import FCST_LAST_WEEK_KEY, FCST_SMA_KEY, FCST_XGB_KEY, forecasters, run_forecasters
+from db.crud import df_parquet_path, read_df
+from tpconfig.tpconfig import forecast_dates
+
+# next to the data, i.e. in SALES_DATA_DIR if set
+default_output_path = df_parquet_path.parent / "backtest_metrics.parquet"
+
+# per worker process: store_id -> rows of the dataset for that store
+_store_dfs: dict[str, pd.DataFrame] = {}
+
+
+def _init_worker(n_threads: int):
+    """Load the dataset once per worker process and limit the threads used by XGB."""
+
+    threadpool_limits(limits=n_threads)
+    _store_dfs.update({store_id: store_df for store_id, store_df in read_df().groupby("store_id", observed=True)})
+
+
+def _backtest_store_week(store_id: str, week_start: dt.date, keys: Sequence[str]) -> pd.DataFrame:
+    """Forecast the week beginning week_start from the history before it, for every series of the store."""
+
+    dates = [week_start + dt.timedelta(days=n) for n in range(7)]
+    store_df = _store_dfs[store_id]
+    history_df = store_df[store_df["start_time"] < pd.Timestamp(week_start)]
+    actual_df = store_df[store_df["start_time"].dt.date.isin(dates)].astype({"section": str, "indicator": str})
+
+    # evaluate with the business features that actually occurred in that week
+    features = {col: actual_df[col].iloc[0] for col in business_features}
+
+    fcst_df, timings = run_forecasters(keys, history_df, store_id, dates, features)
+    fcst_df = fcst_df.merge(actual_df, on=["start_time", "section", "indicator"], how="left")
+
+    rows = []
+    for (section, indicator), _df in fcst_df.groupby(by=["section", "indicator"]):
+        for key in keys:
+            rows.append({
+                "store_id": store_id,
+                "week_start": pd.Timestamp(week_start),
+                "section": section,
+                "indicator": indicator,
+                "model": key,
+                "mse": mean_squared_error(_df.value, _df[key]),
+                "mae": mean_absolute_error(_df.value, _df[key]),
+                # per store and week, for all series
+                "fit_seconds": timings[key]["fit"],
+                "predict_seconds": timings[key]["predict"],
+                **features,
+            })
+
+    return pd.DataFrame(rows)
+
+
+def run_backtest(
+    store_ids: Optional[Sequence[str]] = None,
+    weeks: Sequence[dt.date] = forecast_dates,
+    keys: Sequence[str] = (FCST_SMA_KEY, FCST_LAST_WEEK_KEY, FCST_XGB_KEY),
+    max_workers: Optional[int] = None,
+    n_threads: int = 1,
+    output_path: Optional[Path] = default_output_path,
+) -> pd.DataFrame:
+    """Backtest every store x week in a process pool and return (and optionally write) the metrics.
+
+    Parameters
+    ----------
+    store_ids : Sequence[str], optional
+        If not provided, all stores of the dataset are used.
+    keys : Sequence[str]
+        Keys of the models to evaluate, see `algo.registry`.
+    max_workers : int, optional
+        Number of worker processes, passed to ProcessPoolExecutor.
+    n_threads : int
+        Number of threads each worker may use for XGB.
+    output_path : Path, optional
+        If provided, the metrics are written to this Parquet file.
+    """
+
+    if store_ids is None:
+        store_ids = read_df().store_id.unique().tolist()
+
+    if any(getattr(forecasters[key], "use_feature_store", False) for key in keys):
+        # built once here, instead of by the first task of every worker
+        ensure_feature_store()
+
+    tasks = list(itertools.product(store_ids, weeks))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(n_threads,)) as executor:
+        metrics_dfs = list(executor.map(_backtest_store_week, *zip(*tasks), itertools.repeat(keys)))
+
+    metrics_df = pd.concat(metrics_dfs, ignore_index=True)
+    for col in ["store_id", "section", "indicator", "model"]:
+        metrics_df[col] = metrics_df[col].astype("category")
+
+    if output_path is not None:
+        metrics_df.to_parquet(output_path, index=False)
+
+    return metrics_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stores", nargs="*", help="store ids (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=1, help="threads per worker for XGB")
+    parser.add_argument("--models", nargs="*", default=[FCST_SMA_KEY, FCST_LAST_WEEK_KEY, FCST_XGB_KEY])
+    parser.add_argument("--output", type=Path, default=default_output_path)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    metrics_df = run_backtest(
+        args.stores, keys=args.models, max_workers=args.workers, n_threads=args.threads, output_path=args.output
+    )
+    print(f"{len(metrics_df)} rows written to {args.output} in {time.perf_counter() - start:.1f}s")
+    print(metrics_df.groupby(["model"], observed=True)[["mse", "mae"]].mean())
@@ -0,0 +1,193 @@
+"""Materialized XGB training features of every store/section/indicator series.
+
+None of the features of `algo.forecast._apply_features` depend on the inputs of a scenario, so they are computed once
+on the full dataset and stored as Parquet fragments next to the sales data. Training then only slices them by cutoff.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from algo.forecast import _apply_features, _SLOTS_PER_WEEK, feature_cols
+from db.crud import (
+    df_parquet_path,
+    df_source_mtime,
+    get_tree_mappings,
+    new_version_path,
+    publish_version,
+    read_df,
+    register_append_listener,
+)
+from utils.utils import file_lock
+
+feature_store_path = df_parquet_path.parent / "demo_sales_features"
+
+series_cols = ["store_id", "section", "indicator"]
+store_cols = [*series_cols, "start_time", "y", "day_of_week", *feature_cols]
+
+# update_feature_store merges the fragments once there are more than this
+_MAX_FRAGMENTS = 16
+
+
+def _compute_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Features of every series of df, with store_cols as columns and float32 features."""
+
+    dfs = []
+    for series_key, _df in df.groupby(by=series_cols, observed=True):
+        _df = _df.sort_values("start_time")
+        feature_df = _apply_features(_df.drop(columns=series_cols).reset_index(drop=True))
+        dfs.append(feature_df.assign(**dict(zip(series_cols, series_key))))
+
+    feature_df = pd.concat(dfs, ignore_index=True)[store_cols]
+    feature_df = feature_df.astype({"y": np.float32, "day_of_week": np.int8, **{col: np.float32 for col in feature_cols}})
+    return feature_df.astype({col: str for col in series_cols})
+
+
+def _write_fragment(feature_df: pd.DataFrame, path: Path, name: str):
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_path = path / f".{name}.tmp"
+    feature_df.sort_values([*series_cols, "start_time"]).to_parquet(tmp_path, index=False)
+    tmp_path.rename(path / name)
+
+
+def _lock_path(path: Path) -> Path:
+    """Lock file serializing the writers of the feature store at path, across threads and processes."""
+
+    return path.with_name(f".{path.name}.lock")
+
+
+def build_feature_store(path: Path = feature_store_path):
+    """(Re)build the feature store from the full dataset."""
+
+    with file_lock(_lock_path(path)):
+        _build(path)
+
+
+def _build(path: Path):
+    # written as a new version of the store, see db.crud.publish_version
+    version_path = new_version_path(path)
+    _write_fragment(_compute_features(read_df()), version_path, "part-0.parquet")
+    publish_version(path, version_path)
+
+
+def ensure_feature_store(path: Path = feature_store_path):
+    """Build the feature store if it is missing or older than the dataset.
+
+    Called ahead of time (e.g. on startup, or before starting the workers of a backtest) so that requests find it
+    built. Concurrent callers wait for the first one to build it instead of building it again.
+    """
+
+    if path.exists() and not _is_stale(path):
+        return
+
+    with file_lock(_lock_path(path)):
+        # built by another thread or process while waiting for the lock
+        if not path.exists() or _is_stale(path):
+            _build(path)
+
+
+def update_feature_store(path: Path = feature_store_path) -> int:
+    """Append the features of rows of the dataset that are newer than the latest materialized row of their series.
+
+    Only the rows from one week before the earliest new row are read back to compute y_lag_1w (assuming the regular
+    30-minute grid), unless a series is new. The new rows are written as a new fragment; existing fragments are only
+    rewritten when there are more than _MAX_FRAGMENTS of them, by merging them. Returns the number of appended rows.
+    """
+
+    if not path.exists():
+        build_feature_store(path)
+        return 0
+
+    with file_lock(_lock_path(path)):
+        version_path = path.resolve()
+        latest = (
+            pd.read_parquet(version_path, columns=[*series_cols, "start_time"])
+            .astype({col: str for col in series_cols})
+            .groupby(series_cols)
+            .start_time.max()
+            .rename("latest")
+        )
+        n_series = sum(len(indicators) for sections in get_tree_mappings().values() for indicators in sections.values())
+        has_new_series = len(latest) < n_series
+        start = None if has_new_series else latest.min() - pd.Timedelta(weeks=1)
+        df = read_df(start=start).astype({col: str for col in series_cols}).join(latest, on=series_cols)
+        is_new = df["latest"].isna() | (df["start_time"] > df["latest"])
+        if not is_new.any():
+            return 0
+
+        # the last week of rows before the new ones (positionally, as in _apply_features) provides y_lag_1w
+        old_df = df[~is_new].sort_values([*series_cols, "start_time"])
+        old_df = old_df[old_df.groupby(series_cols).cumcount(ascending=False) < _SLOTS_PER_WEEK]
+        feature_df = _compute_features(pd.concat([old_df, df[is_new]]).drop(columns="latest"))
+        feature_df = feature_df.join(latest, on=series_cols)
+        feature_df = feature_df[feature_df["latest"].isna() | (feature_df["start_time"] > feature_df["latest"])]
+
+        n_fragments = len(list(version_path.glob("part-*.parquet")))
+        _write_fragment(feature_df[store_cols], version_path, f"part-{n_fragments}.parquet")
+        if n_fragments + 1 > _MAX_FRAGMENTS:
+            _compact(path)
+        return len(feature_df)
+
+
+def _compact(path: Path):
+    """Merge the fragments of the store at path into part-0.parquet of a new version, see db.crud.publish_version."""
+
+    version_path = new_version_path(path)
+    _write_fragment(pd.read_parquet(path.resolve()), version_path, "part-0.parquet")
+    publish_version(path, version_path)
+
+
+def _is_stale(path: Path) -> bool:
+    """Whether the dataset was rewritten after the latest fragment was written."""
+
+    fragments = list(path.resolve().glob("part-*.parquet"))
+    if not fragments:
+        return True
+    return df_source_mtime() > max(fragment.stat().st_mtime for fragment in fragments)
+
+
+def read_features(
+    store_id: str, end: Optional[pd.Timestamp] = None, path: Path = feature_store_path
+) -> pd.DataFrame:
+    """Features of every series of store_id, up to and including end.
+
+    The feature store is built if it was not built ahead of time (see `ensure_feature_store`), and rebuilt if the
+    dataset was rewritten since.
+    """
+
+    ensure_feature_store(path)
+
+    filters = [("store_id", "==", store_id)]
+    if end is not None:
+        filters.append(("start_time", "<=", end))
+    # resolved once, the store being replaced by compactions (see db.crud.publish_version)
+    return pd.read_parquet(path.resolve(), filters=filters)
+
+
+def read_training_matrices(
+    store_id: str, end: Optional[pd.Timestamp] = None, path: Path = feature_store_path
+) -> dict[tuple[str, str], tuple[np.ndarray, np.ndarray]]:
+    """(section, indicator) -> float32 (X, y) training matrix of every series of store_id, see `read_features`.
+
+    The matrices of all series are views into a single store-wide matrix, built once from the feature store.
+    """
+
+    features_df = read_features(store_id, end=end, path=path)
+    features_df = features_df.sort_values(["section", "indicator", "start_time"], ignore_index=True)
+    X = features_df[feature_cols].to_numpy(dtype=np.float32)
+    y = features_df["y"].to_numpy(dtype=np.float32)
+
+    # rows of a series are contiguous once sorted, so slicing does not copy
+    return {
+        section_indicator: (X[positions[0] : positions[-1] + 1], y[positions[0] : positions[-1] + 1])
+        for section_indicator, positions in features_df.groupby(by=["section", "indicator"]).indices.items()
+    }
+
+
+@register_append_listener
+def _update_after_append():
+    # a feature store that was never built is built on first use instead
+    if feature_store_path.exists():
+        update_feature_store()
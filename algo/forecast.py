@@ -1,12 +1,14 @@
 """Forecasting algorithms."""
 
 import datetime as dt
+import hashlib
 from typing import Any, Optional, Sequence
 
 import numpy as np
 import pandas as pd
 from xgboost import XGBRegressor
 
+from algo.model_cache import model_cache
 from utils.utils import TIME_STEP
 
 
@@ -51,6 +53,95 @@ def _generate_dummy_future(start, end, freq, inclusive: str | None = None):
     return dummy_future
 
 
+_SLOTS_PER_WEEK = int(pd.Timedelta(weeks=1) / TIME_STEP)
+
+
+def _is_regular_series(series: pd.Series) -> bool:
+    """Check whether the series is a sorted, gapless, tz-naive grid with step TIME_STEP.
+
+    On such a grid, the (day_of_week, time) group of a timestamp is its position modulo one week of slots, which lets
+    the seasonal forecasts below be computed with array indexing instead of a groupby.
+    """
+
+    index = series.index
+    if not isinstance(index, pd.DatetimeIndex) or index.tz is not None:
+        return False
+    return bool((np.diff(index.values) == TIME_STEP.to_timedelta64()).all())
+
+
+def _n_future_weeks(latest_timestamp: pd.Timestamp, max_date: dt.date) -> int:
+    """Number of weeks to append after latest_timestamp until max_date is reached."""
+
+    n_days = (max_date - latest_timestamp.date()).days
+    return max(0, -(-n_days // 7))
+
+
+def _extend_series(series: pd.Series, fcst: np.ndarray) -> pd.Series:
+    """Append fcst (one value per TIME_STEP) after the latest timestamp of series."""
+
+    if len(fcst) == 0:
+        return series.copy()
+
+    future_index = pd.date_range(series.index[-1] + TIME_STEP, periods=len(fcst), freq=TIME_STEP, name="start_time")
+    values = np.concatenate([series.to_numpy(dtype=float), fcst])
+    return pd.Series(values, index=series.index.append(future_index), name=series.name)
+
+
+def _seasonal_sma(values: np.ndarray, window: int, n_weeks: int) -> np.ndarray:
+    """Recursive seasonal SMA over a weeks x slots grid.
+
+    The last `window` weeks of values are reshaped into a (weeks, _SLOTS_PER_WEEK) array so that each column holds a
+    single (day_of_week, time) slot. Each future week is the NaN-aware column mean of the `window` weeks before it,
+    previously forecast weeks included. This matches `_forecast_sma` applied week by week, at a cost independent of
+    the length of the history.
+
+    The grid is built once, and each future week is one reduction over all slots at once. Only the forecast weeks are
+    iterated, as each is an input of the next: n_weeks iterations (usually 1, at most the number of weeks of a
+    request), against one per week and slot before.
+    """
+
+    assert window > 0
+
+    n_history_slots = window * _SLOTS_PER_WEEK
+    tail = values[-n_history_slots:]
+
+    grid = np.full(((window + n_weeks) * _SLOTS_PER_WEEK), np.nan)
+    grid[n_history_slots - len(tail) : n_history_slots] = tail
+    grid = grid.reshape(window + n_weeks, _SLOTS_PER_WEEK)
+
+    for week in range(window, window + n_weeks):
+        block = grid[week - window : week]
+        valid = ~np.isnan(block)
+        count = valid.sum(axis=0)
+        total = np.where(valid, block, 0.0).sum(axis=0)
+        np.divide(total, count, out=grid[week], where=count > 0)
+
+    return grid[window:].ravel()
+
+
+def _last_week(values: np.ndarray) -> np.ndarray:
+    """The last _SLOTS_PER_WEEK values, NaN-padded at the front if there is less than a week of values."""
+
+    last_week = np.full(_SLOTS_PER_WEEK, np.nan)
+    tail = values[-_SLOTS_PER_WEEK:]
+    last_week[_SLOTS_PER_WEEK - len(tail) :] = tail
+    return last_week
+
+
+def _seasonal_naive(values: np.ndarray, n_weeks: int) -> np.ndarray:
+    """Repeat the last observed week of values n_weeks times.
+
+    Equivalent to `_forecast_last_week` applied week by week: every future slot copies the slot one week earlier, so
+    the whole horizon is a tile of the last week. Slots without a week of history are NaN.
+    """
+
+    return np.tile(_last_week(values), n_weeks)
+
+
+def _subset_dates(series: pd.Series, dates: Sequence[dt.date]) -> pd.Series:
+    return series[series.index.normalize().isin(pd.to_datetime(list(dates)))]
+
+
 def forecast_sma(series: pd.Series, window: int = 4, dates: Optional[list[dt.date]] = None) -> pd.Series:
     """
     Parameters
@@ -69,6 +160,11 @@ def forecast_sma(series: pd.Series, window: int = 4, dates: Optional[list[dt.dat
         latest_date = series.index.max().date()
         dates = [latest_date + dt.timedelta(days=i) for i in range(1, _DEFAULT_N_DAYS + 1)]
 
+    if _is_regular_series(series):
+        n_weeks = _n_future_weeks(series.index[-1], max(dates))
+        fcst = _seasonal_sma(series.to_numpy(dtype=float), window=window, n_weeks=n_weeks)
+        return _subset_dates(_extend_series(series, fcst), dates)
+
     expanding_series = series.copy()
     while max(expanding_series.index.to_series().dt.date.to_list()) < max(dates):
         expanding_series_max_date = expanding_series.index.max()
@@ -106,6 +202,11 @@ def forecast_last_week(series: pd.Series, dates: Optional[list[dt.date]] = None)
         latest_date = series.index.max().date()
         dates = [latest_date + dt.timedelta(days=i) for i in range(1, _DEFAULT_N_DAYS + 1)]
 
+    if _is_regular_series(series):
+        n_weeks = _n_future_weeks(series.index[-1], max(dates))
+        fcst = _seasonal_naive(series.to_numpy(dtype=float), n_weeks=n_weeks)
+        return _subset_dates(_extend_series(series, fcst), dates)
+
     expanding_series = series.copy()
     while max(expanding_series.index.to_series().dt.date.to_list()) < max(dates):
         expanding_series_max_date = expanding_series.index.max()
@@ -129,18 +230,18 @@ time_features = ["time_block", "is_weekend", "y_lag_1w"]
 business_features = ["promo", "pollution"]
 feature_cols = time_features + business_features
 
-def _forecast_next_week_xgb(df: pd.DataFrame, xgb: XGBRegressor, features: dict[str: Any]) -> pd.DataFrame:
-    """Forecast and return the next 7 days."""
+def _next_week_features(future_index: pd.DatetimeIndex, y_lag_1w: np.ndarray, features: dict[str:Any]) -> pd.DataFrame:
+    """Features for the forecast horizon only, given the values one week before each timestamp of future_index.
 
-    df = df.copy()
-    
-    max_date = df["start_time"].max()
-    fcst = _generate_dummy_future(max_date, max_date + pd.Timedelta(weeks=1), freq=TIME_STEP, inclusive="right")
-    fcst_df = fcst.reset_index().assign(**features)  # apply feature map
-    feature_df = _apply_features(pd.concat([df, fcst_df]).reset_index())
-    fcst_df["value"] = xgb.predict(feature_df[feature_cols].iloc[-len(fcst):])
+    Produces the same feature_cols as `_apply_features`, without touching the history.
+    """
 
-    return fcst_df[["start_time", "value", *business_features]]
+    feature_df = pd.DataFrame({"start_time": future_index}).assign(**features)  # apply feature map
+    feature_df["time_block"] = future_index.hour + future_index.minute / 60
+    feature_df["is_weekend"] = (future_index.dayofweek > 4).astype(int)
+    feature_df["y_lag_1w"] = y_lag_1w
+
+    return feature_df
 
 def _apply_features(df: pd.DataFrame):
     cols = ["start_time", "value", *business_features]
@@ -157,7 +258,271 @@ def _apply_features(df: pd.DataFrame):
 
     return feature_df
 
-def forecast_xgb(df: pd.DataFrame, dates: Optional[Sequence[dt.date]] = None, features: dict[str: Any] = {}) -> pd.Series:
+direct_feature_cols = ["time_block", "is_weekend", "y_lag_hw", "horizon", *business_features]
+
+
+def _weekly_lag_matrix(values: np.ndarray, n_weeks: int) -> np.ndarray:
+    """Strided (len(values), n_weeks) view whose column h - 1 holds the value h weeks before each position.
+
+    Positions with less than h weeks of history are NaN.
+    """
+
+    n_lag_slots = n_weeks * _SLOTS_PER_WEEK
+    padded = np.concatenate([np.full(n_lag_slots, np.nan), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n_lag_slots + 1)
+    return windows[:, n_lag_slots - _SLOTS_PER_WEEK :: -_SLOTS_PER_WEEK]
+
+
+def _direct_feature_matrix(
+    start_time: pd.DatetimeIndex, y_lag_hw: np.ndarray, horizon: np.ndarray, business: np.ndarray
+) -> np.ndarray:
+    """float32 matrix with direct_feature_cols as columns."""
+
+    return np.column_stack([
+        start_time.hour + start_time.minute / 60,
+        start_time.dayofweek > 4,
+        y_lag_hw,
+        horizon,
+        business,
+    ]).astype(np.float32)
+
+
+# histogram settings of the XGB models, per-series and global; fitted on float32 matrices, XGB bins them into a
+# QuantileDMatrix without converting the data first
+XGB_TREE_METHOD = "hist"
+XGB_MAX_BIN = 256
+
+# number of trees added when a model is warm started on a new week of data
+XGB_WARM_START_N_ESTIMATORS = 10
+_WARM_START_GENERATION_ATTR = "warm_start_generation"
+
+
+def _new_xgb(**params) -> XGBRegressor:
+    return XGBRegressor(tree_method=XGB_TREE_METHOD, max_bin=XGB_MAX_BIN, **params)
+
+
+def _training_matrix(feature_df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """float32 (X, y) of feature_df, with feature_cols as columns of X."""
+
+    return feature_df[feature_cols].to_numpy(dtype=np.float32), feature_df["y"].to_numpy(dtype=np.float32)
+
+
+def _fit_on_matrix(xgb: XGBRegressor, X: np.ndarray, y: np.ndarray, columns: Sequence[str], **kwargs) -> XGBRegressor:
+    """Fit xgb on the float32 matrix X without copying it, keeping columns as the feature names of the model."""
+
+    return xgb.fit(pd.DataFrame(X, columns=columns, copy=False), y, **kwargs)
+
+
+def _data_version(df: pd.DataFrame) -> str:
+    """Hash of the rows of df that a model is fitted on, i.e. of start_time, value and the business features."""
+
+    hashes = pd.util.hash_pandas_object(df[["start_time", "value", *business_features]], index=False)
+    return hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()
+
+
+def _xgb_cache_key(
+    cache_key: tuple, df: pd.DataFrame, params: dict[str, Any], n_weeks: Optional[int] = None, warm_start: bool = False
+) -> str:
+    """Key of the model fitted on df in model_cache, which changes with the content of df (see `_data_version`)."""
+
+    max_date = df["start_time"].max()
+    if n_weeks is not None:
+        series_key, cols = (*cache_key, max_date, "direct", n_weeks), direct_feature_cols
+    elif warm_start:
+        series_key, cols = (*cache_key, max_date, "warm_start"), feature_cols
+    else:
+        series_key, cols = (*cache_key, max_date), feature_cols
+    return model_cache.make_key(series_key, _data_version(df), cols, params)
+
+
+def _warm_start_xgb(
+    df: pd.DataFrame, cache_key: tuple, params: dict[str, Any], full_retrain_interval: int
+) -> Optional[XGBRegressor]:
+    """Continue boosting the cached model of the previous cutoff (one week earlier) on the newly added week only.
+
+    Returns None if there is no such model, or if the chain of warm starts since the last full fit has reached
+    full_retrain_interval, in which case the caller fits from scratch.
+    """
+
+    prev_max_date = df["start_time"].max() - pd.Timedelta(weeks=1)
+    # the model of the previous cutoff is only continued if the data it was fitted on is unchanged
+    prev_df = df[df["start_time"] <= prev_max_date]
+    for warm_start in (True, False):
+        prev_xgb = model_cache.get(_xgb_cache_key(cache_key, prev_df, params, warm_start=warm_start))
+        if prev_xgb is not None:
+            break
+    else:
+        return None
+
+    generation = int(prev_xgb.get_booster().attr(_WARM_START_GENERATION_ATTR) or 0) + 1
+    if generation >= full_retrain_interval:
+        return None
+
+    # the week before the new one is included so that y_lag_1w of the new week can be computed
+    feature_df = _apply_features(df[df["start_time"] > prev_max_date - pd.Timedelta(weeks=1)])
+    X, y = _training_matrix(feature_df[feature_df["start_time"] > prev_max_date])
+
+    xgb = XGBRegressor(**{**params, "n_estimators": XGB_WARM_START_N_ESTIMATORS})
+    _fit_on_matrix(xgb, X, y, feature_cols, xgb_model=prev_xgb.get_booster())
+    xgb.get_booster().set_attr(**{_WARM_START_GENERATION_ATTR: str(generation)})
+    return xgb
+
+
+def _fit_xgb(
+    df: pd.DataFrame,
+    cache_key: Optional[tuple] = None,
+    n_weeks: Optional[int] = None,
+    warm_start: bool = False,
+    full_retrain_interval: int = 4,
+    training_matrix: Optional[tuple[np.ndarray, np.ndarray]] = None,
+) -> XGBRegressor:
+    """Fit an XGB model on df, or fetch it from model_cache if cache_key is given.
+
+    If n_weeks is None, the model is fitted on feature_cols for the recursive strategy. Otherwise it is fitted on
+    direct_feature_cols for the direct strategy: every row of df is repeated for each horizon h in 1..n_weeks, with the
+    value h weeks earlier as the lag.
+
+    The latest timestamp of df (i.e. the cutoff) and a hash of its content are part of the cache key, along with the
+    features and hyperparameters, so that a model is refit when the data before the cutoff is rewritten.
+    With warm_start (recursive strategy and cache_key only), see `_warm_start_xgb`.
+
+    For the recursive strategy, training_matrix may hold the precomputed float32 (X, y) of df, X having feature_cols as
+    columns (e.g. from `algo.feature_store.read_training_matrices`), which is then used instead of
+    `_apply_features(df)`.
+    """
+
+    xgb = _new_xgb()
+    params = xgb.get_params()
+    warm_start = warm_start and cache_key is not None and n_weeks is None
+    if cache_key is not None:
+        key = _xgb_cache_key(cache_key, df, params, n_weeks=n_weeks, warm_start=warm_start)
+        cached_xgb = model_cache.get(key)
+        if cached_xgb is not None:
+            return cached_xgb
+
+    warm_xgb = _warm_start_xgb(df, cache_key, params, full_retrain_interval) if warm_start else None
+    if warm_xgb is not None:
+        xgb = warm_xgb
+    elif n_weeks is None:
+        X, y = training_matrix if training_matrix is not None else _training_matrix(_apply_features(df))
+        _fit_on_matrix(xgb, X, y, feature_cols)
+    else:
+        values = df["value"].to_numpy(dtype=float)
+        lags = _weekly_lag_matrix(values, n_weeks)
+        X = _direct_feature_matrix(
+            pd.DatetimeIndex(np.tile(df["start_time"].to_numpy(), n_weeks)),
+            lags.T.ravel(),  # horizon-major, matching the tiles
+            np.repeat(np.arange(1, n_weeks + 1), len(df)),
+            np.tile(df[business_features].to_numpy(dtype=float), (n_weeks, 1)),
+        )
+        xgb.fit(X, np.tile(values, n_weeks).astype(np.float32))
+
+    if cache_key is not None:
+        model_cache.put(key, xgb)
+    return xgb
+
+
+def _n_direct_weeks(df: pd.DataFrame, dates: Sequence[dt.date]) -> int:
+    """Number of weeks from the first slot after the latest timestamp of df needed to cover dates."""
+
+    first_future = df["start_time"].max() + TIME_STEP
+    return int(np.ceil((pd.Timestamp(max(dates) + dt.timedelta(days=1)) - first_future) / pd.Timedelta(weeks=1)))
+
+
+def fit_xgb(
+    df: pd.DataFrame,
+    dates: Optional[Sequence[dt.date]] = None,
+    cache_key: Optional[tuple] = None,
+    strategy: str = "recursive",
+    warm_start: bool = False,
+    full_retrain_interval: int = 4,
+    training_matrix: Optional[tuple[np.ndarray, np.ndarray]] = None,
+) -> XGBRegressor:
+    """Fit the model used by `forecast_xgb`, which can then be passed to it as `xgb`.
+
+    Parameters are those of `forecast_xgb`. dates is only needed by the direct strategy, whose model depends on the
+    number of forecast weeks. training_matrix optionally holds precomputed training data, see `_fit_xgb`.
+    """
+
+    assert strategy in ("recursive", "direct"), f"invalid strategy: {strategy}"
+
+    if strategy == "direct":
+        return _fit_xgb(df, cache_key=cache_key, n_weeks=_fit_n_weeks(df, dates))
+    return _fit_xgb(
+        df,
+        cache_key=cache_key,
+        warm_start=warm_start,
+        full_retrain_interval=full_retrain_interval,
+        training_matrix=training_matrix,
+    )
+
+
+def _fit_n_weeks(df: pd.DataFrame, dates: Optional[Sequence[dt.date]]) -> int:
+    """n_weeks of the model of the direct strategy."""
+
+    if dates is None:
+        dates = [df["start_time"].max().date() + dt.timedelta(days=7)]
+    return max(1, _n_direct_weeks(df, dates))
+
+
+def get_cached_xgb(
+    df: pd.DataFrame,
+    cache_key: tuple,
+    dates: Optional[Sequence[dt.date]] = None,
+    strategy: str = "recursive",
+    warm_start: bool = False,
+) -> Optional[XGBRegressor]:
+    """The model that `fit_xgb` with the same arguments would fetch from model_cache, or None. Never fits.
+
+    A model found on disk is loaded into the memory tier of model_cache, so that the following fit_xgb is cheap.
+    """
+
+    n_weeks = _fit_n_weeks(df, dates) if strategy == "direct" else None
+    params = _new_xgb().get_params()
+    warm_start = warm_start and n_weeks is None
+    key = _xgb_cache_key(cache_key, df, params, n_weeks=n_weeks, warm_start=warm_start)
+    return model_cache.get(key)
+
+
+def _forecast_xgb_direct(
+    df: pd.DataFrame, dates: Sequence[dt.date], features: dict[str:Any], xgb: XGBRegressor
+) -> pd.DataFrame:
+    """Forecast all slots of the passed dates with one predict call, without feeding predictions back as lags.
+
+    For horizon week h, the lag h weeks before a future slot always falls in the last observed week, so the future
+    feature matrix is a tile of that week.
+    """
+
+    max_date = df["start_time"].max()
+    n_weeks = _n_direct_weeks(df, dates)
+    if n_weeks <= 0:
+        return df[["start_time", "value"]]
+
+    future_index = pd.date_range(max_date + TIME_STEP, periods=n_weeks * _SLOTS_PER_WEEK, freq=TIME_STEP)
+    is_requested = future_index.normalize().isin(pd.to_datetime(list(dates)))
+    future_index = future_index[is_requested]
+
+    X = _direct_feature_matrix(
+        future_index,
+        np.tile(_last_week(df["value"].to_numpy(dtype=float)), n_weeks)[is_requested],
+        np.repeat(np.arange(1, n_weeks + 1), _SLOTS_PER_WEEK)[is_requested],
+        np.tile([float(features[col]) for col in business_features], (len(future_index), 1)),
+    )
+    fcst_df = pd.DataFrame({"start_time": future_index, "value": xgb.predict(X).astype(float)})
+
+    return pd.concat([df[["start_time", "value"]], fcst_df])
+
+
+def forecast_xgb(
+    df: pd.DataFrame,
+    dates: Optional[Sequence[dt.date]] = None,
+    features: dict[str: Any] = {},
+    cache_key: Optional[tuple] = None,
+    strategy: str = "recursive",
+    warm_start: bool = False,
+    full_retrain_interval: int = 4,
+    xgb: Optional[XGBRegressor] = None,
+) -> pd.Series:
     """
     Parameters
     ----------
@@ -166,6 +531,20 @@ def forecast_xgb(df: pd.DataFrame, dates: Optional[Sequence[dt.date]] = None, fe
     features : dict[str, Any]
         Dictionary of feature name to feature value (scalar). E.g. {"promo": 0} creates a "promo" feature column with
         value 0.
+    cache_key : tuple, optional
+        Identifies the series of df, e.g. (store_id, section, indicator). If provided, the trained model is looked up in
+        and stored to `algo.model_cache.model_cache`, so that forecasts with other `features` only pay for predict.
+    strategy : str
+        "recursive" forecasts one week at a time, feeding each week's forecast back as y_lag_1w of the next.
+        "direct" trains a single model with a horizon (in weeks) feature and forecasts all dates in one predict call.
+    warm_start : bool
+        Requires cache_key and the recursive strategy. If the model of the previous cutoff (one week earlier) is cached,
+        continue boosting it on the newly added week only, instead of fitting on the whole history.
+    full_retrain_interval : int
+        With warm_start, fit from scratch once a model would be the full_retrain_interval-th in a chain of weekly
+        warm starts, so that at most full_retrain_interval - 1 warm starts follow a full fit.
+    xgb : XGBRegressor, optional
+        Model returned by `fit_xgb` with the same strategy. If provided, no model is fitted.
     """
 
     _DEFAULT_N_DAYS = 7
@@ -178,15 +557,215 @@ def forecast_xgb(df: pd.DataFrame, dates: Optional[Sequence[dt.date]] = None, fe
         dates = [latest_date + dt.timedelta(days=i) for i in range(1, _DEFAULT_N_DAYS + 1)]
 
     # train xgb model
-    xgb = XGBRegressor()
+    if xgb is None:
+        xgb = fit_xgb(df, dates, cache_key, strategy, warm_start=warm_start, full_retrain_interval=full_retrain_interval)
+
+    if strategy == "direct":
+        expanding_df = _forecast_xgb_direct(df, dates, features, xgb)
+    else:
+        # only the last week of values is needed for y_lag_1w, so the recursion keeps a buffer of _SLOTS_PER_WEEK
+        # values (positionally, like the shift in _apply_features) instead of recomputing features over the history
+        lag_buffer = _last_week(df["value"].to_numpy(dtype=float))
+
+        fcst_dfs = [df[["start_time", "value"]]]
+        max_date = df["start_time"].max()
+        while max_date < pd.Timestamp(max(dates) + dt.timedelta(days=1)):
+            future_index = pd.date_range(max_date + TIME_STEP, periods=_SLOTS_PER_WEEK, freq=TIME_STEP)
+            feature_df = _next_week_features(future_index, lag_buffer, features)
+            lag_buffer = xgb.predict(feature_df[feature_cols]).astype(float)
+            fcst_dfs.append(pd.DataFrame({"start_time": future_index, "value": lag_buffer}))
+            max_date = future_index[-1]
+
+        expanding_df = pd.concat(fcst_dfs)
+
+    # subset with passed dates
+    fcst = expanding_df[expanding_df["start_time"].dt.date.isin(dates)].set_index("start_time").value
+    return fcst
+
+def forecast_xgb_what_if(
+    df: pd.DataFrame,
+    dates: Sequence[dt.date],
+    feature_grid: Sequence[dict[str, Any]],
+    xgb: XGBRegressor,
+    strategy: str = "recursive",
+) -> pd.DataFrame:
+    """Forecast dates for every combination of business features of feature_grid with a single model.
+
+    The future frames of all combinations are stacked, so that each forecast week takes one predict call whatever the
+    size of feature_grid. Each row of the result equals the forecast of `forecast_xgb` with the same features.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns start_time, the columns of feature_grid (e.g. promo and pollution) and value, with the combinations in
+        the order of feature_grid.
+    """
+
+    grid_df = pd.DataFrame(list(feature_grid))
+    n_combos = len(grid_df)
+    max_date = df["start_time"].max()
+    last_week = _last_week(df["value"].to_numpy(dtype=float))
+
+    if strategy == "direct":
+        n_weeks = max(0, _n_direct_weeks(df, dates))
+        future_index = pd.date_range(max_date + TIME_STEP, periods=n_weeks * _SLOTS_PER_WEEK, freq=TIME_STEP)
+        is_requested = future_index.normalize().isin(pd.to_datetime(list(dates)))
+        future_index = future_index[is_requested]
+
+        X = _direct_feature_matrix(
+            pd.DatetimeIndex(np.tile(future_index, n_combos)),
+            np.tile(np.tile(last_week, n_weeks)[is_requested], n_combos),
+            np.tile(np.repeat(np.arange(1, n_weeks + 1), _SLOTS_PER_WEEK)[is_requested], n_combos),
+            np.repeat(grid_df[business_features].to_numpy(dtype=float), len(future_index), axis=0),
+        )
+        values = xgb.predict(X).astype(float).reshape(n_combos, -1)
+    else:
+        # one lag buffer per combination, see forecast_xgb
+        lag_buffers = np.tile(last_week, (n_combos, 1))
+        future_indexes = []
+        week_values = []
+        while max_date < pd.Timestamp(max(dates) + dt.timedelta(days=1)):
+            week_index = pd.date_range(max_date + TIME_STEP, periods=_SLOTS_PER_WEEK, freq=TIME_STEP)
+            feature_df = _next_week_features(
+                pd.DatetimeIndex(np.tile(week_index, n_combos)),
+                lag_buffers.ravel(),
+                {col: np.repeat(grid_df[col].to_numpy(), _SLOTS_PER_WEEK) for col in grid_df},
+            )
+            lag_buffers = xgb.predict(feature_df[feature_cols]).astype(float).reshape(n_combos, _SLOTS_PER_WEEK)
+            future_indexes.append(week_index)
+            week_values.append(lag_buffers)
+            max_date = week_index[-1]
+
+        future_index = pd.DatetimeIndex(np.concatenate(future_indexes)) if future_indexes else pd.DatetimeIndex([])
+        values = np.hstack(week_values) if week_values else np.empty((n_combos, 0))
+        is_requested = future_index.normalize().isin(pd.to_datetime(list(dates)))
+        future_index = future_index[is_requested]
+        values = values[:, is_requested]
+
+    what_if_df = grid_df.loc[grid_df.index.repeat(len(future_index))].reset_index(drop=True)
+    what_if_df.insert(0, "start_time", np.tile(future_index, n_combos))
+    what_if_df["value"] = values.ravel()
+    return what_if_df
+
+
+global_categorical_features = ["section", "indicator"]
+global_feature_cols = feature_cols + global_categorical_features
+
+
+def _apply_global_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Like `_apply_features`, for a frame holding several section/indicator series sorted by series and start_time.
+
+    The lag is shifted within each series so that it never crosses a series boundary.
+    """
+
     feature_df = _apply_features(df)
-    xgb.fit(feature_df[feature_cols], feature_df.y)
+    feature_df["y_lag_1w"] = feature_df.groupby(global_categorical_features, observed=True).y.shift(
+        periods=_SLOTS_PER_WEEK
+    )
+    return feature_df
+
+
+def _forecast_next_week_xgb_global(df: pd.DataFrame, xgb: XGBRegressor, features: dict[str:Any]) -> pd.DataFrame:
+    """Forecast and return the next 7 days of every series in df with a single predict call."""
+
+    max_date = df["start_time"].max()
+    fcst = _generate_dummy_future(max_date, max_date + pd.Timedelta(weeks=1), freq=TIME_STEP, inclusive="right")
+    series_keys = df[global_categorical_features].drop_duplicates()
+    fcst_df = series_keys.merge(fcst.reset_index(), how="cross").assign(**features)  # apply feature map
+
+    expanding_df = pd.concat([df, fcst_df], ignore_index=True)
+    expanding_df = expanding_df.sort_values([*global_categorical_features, "start_time"], ignore_index=True)
+    feature_df = _apply_global_features(expanding_df)
+    is_future = (feature_df["start_time"] > max_date).to_numpy()
+
+    fcst_df = expanding_df[is_future].copy()
+    fcst_df["value"] = xgb.predict(feature_df.loc[is_future, global_feature_cols])
+
+    return fcst_df[["start_time", *global_categorical_features, "value", *business_features]]
+
+
+def _prepare_global_df(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.Series]:
+    """Sort df by series and start_time, and scale each series by its mean.
+
+    Series differ in scale by orders of magnitude (e.g. Sales vs Transactions), so the global model is trained on
+    values relative to each series' mean. Returns the scaled df and the scale of each series.
+    """
+
+    df = df[["start_time", *global_categorical_features, "value", *business_features]]
+    df = df.astype({col: "category" for col in global_categorical_features})
+    df = df.sort_values([*global_categorical_features, "start_time"], ignore_index=True)
+
+    scale = df.groupby(global_categorical_features, observed=True).value.mean().replace(0, 1).rename("scale")
+    df = df.assign(value=df["value"] / df.join(scale, on=global_categorical_features)["scale"])
+    return df, scale
+
+
+def _fit_xgb_global(df: pd.DataFrame) -> XGBRegressor:
+    """Fit the global model on a df prepared by `_prepare_global_df`."""
+
+    xgb = _new_xgb(enable_categorical=True)
+    feature_df = _apply_global_features(df)
+    xgb.fit(feature_df[global_feature_cols], feature_df.y)
+    return xgb
+
+
+def fit_xgb_global(df: pd.DataFrame) -> XGBRegressor:
+    """Fit the model used by `forecast_xgb_global`, which can then be passed to it as `xgb`."""
+
+    return _fit_xgb_global(_prepare_global_df(df)[0])
+
+
+def forecast_xgb_global(
+    df: pd.DataFrame,
+    dates: Optional[Sequence[dt.date]] = None,
+    features: dict[str:Any] = {},
+    xgb: Optional[XGBRegressor] = None,
+) -> pd.DataFrame:
+    """Forecast every section/indicator series of a store with one XGB model.
+
+    Unlike `forecast_xgb`, which is fitted on a single series, the model is fitted once on all series of df, with
+    section and indicator as categorical features.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Store data with columns start_time, section, indicator, value and the business features.
+    dates : Sequence[dt.date], optional
+        If not provided, the immediate 7 days following the date of the latest timestamp is used.
+    features : dict[str, Any]
+        Dictionary of feature name to feature value (scalar). E.g. {"promo": 0} creates a "promo" feature column with
+        value 0.
+    xgb : XGBRegressor, optional
+        Model returned by `fit_xgb_global`. If provided, no model is fitted.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns start_time, section, indicator and value (the forecast), for the passed dates.
+    """
+
+    _DEFAULT_N_DAYS = 7
+
+    if df.empty:
+        return df
+
+    if dates is None:
+        latest_date = df["start_time"].max().date()
+        dates = [latest_date + dt.timedelta(days=i) for i in range(1, _DEFAULT_N_DAYS + 1)]
+
+    df, scale = _prepare_global_df(df)
+
+    # train xgb model
+    if xgb is None:
+        xgb = _fit_xgb_global(df)
 
-    expanding_df = df[["start_time", "value", *business_features]].copy()
-    while expanding_df["start_time"].max() < pd.Timestamp(max(dates)+dt.timedelta(days=1)):
-        _fcst = _forecast_next_week_xgb(expanding_df, xgb, features)
-        expanding_df = pd.concat([expanding_df, _fcst])
+    expanding_df = df
+    while expanding_df["start_time"].max() < pd.Timestamp(max(dates) + dt.timedelta(days=1)):
+        _fcst = _forecast_next_week_xgb_global(expanding_df, xgb, features)
+        expanding_df = pd.concat([expanding_df, _fcst], ignore_index=True)
 
     # subset with passed dates
-    fcst = expanding_df[expanding_df["start_time"].dt.date.isin(dates)].value
-    return fcst
\ No newline at end of file
+    fcst = expanding_df[expanding_df["start_time"].dt.date.isin(dates)]
+    fcst = fcst.join(scale, on=global_categorical_features)
+    fcst = fcst.assign(value=fcst["value"] * fcst["scale"])
+    return fcst[["start_time", *global_categorical_features, "value"]].reset_index(drop=True)
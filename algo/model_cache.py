@@ -0,0 +1,123 @@
+"""Two-tier (memory + disk) cache of trained models."""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional, Sequence
+
+from xgboost import XGBRegressor
+
+from db.crud import df_parquet_path
+
+
+class ModelCache:
+    """Cache of fitted XGBRegressor models.
+
+    The memory tier is an LRU of models of at most `max_memory_bytes` in total, a model being sized by its UBJSON file.
+    The disk tier stores each model as a UBJSON file in `cache_dir` and, once it grows beyond `max_disk_bytes`, deletes
+    the least recently used files first.
+    """
+
+    def __init__(self, cache_dir: Path, max_memory_bytes: int = 64 * 2**20, max_disk_bytes: int = 256 * 2**20):
+        self.cache_dir = Path(cache_dir)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, tuple[XGBRegressor, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        series_key: Sequence[Hashable], data_version: str, feature_cols: Sequence[str], params: dict[str, Any]
+    ) -> str:
+        """Hash the training data identity and version, the feature list and the model hyperparameters into a cache key.
+
+        data_version must change whenever the training data does (e.g. a hash of its content), so that a model fitted
+        on data that was since rewritten is not served.
+
+        E.g. make_key(("001", "MAINS", "Sales", "2024-01-07 23:30:00"), "9f86d0", feature_cols, xgb.get_params())
+        """
+
+        payload = json.dumps(
+            [list(map(str, series_key)), data_version, list(feature_cols), params], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.ubj"
+
+    def get(self, key: str) -> Optional[XGBRegressor]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key][0]
+
+            path = self._path(key)
+            if not path.exists():
+                return None
+
+            model = XGBRegressor()
+            try:
+                model.load_model(path)
+            except Exception:
+                # e.g. truncated by a crash or removed by a concurrent eviction
+                return None
+            try:
+                os.utime(path)  # mark as recently used for disk eviction
+                nbytes = path.stat().st_size
+            except FileNotFoundError:
+                return model
+            self._remember(key, model, nbytes)
+            return model
+
+    def put(self, key: str, model: XGBRegressor):
+        with self._lock:
+            # write to a private file first so that readers never see a partially written model
+            tmp_dir = self.cache_dir / "tmp"
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = tmp_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.ubj"
+            model.save_model(tmp_path)
+            nbytes = tmp_path.stat().st_size
+            os.replace(tmp_path, self._path(key))
+            self._remember(key, model, nbytes)
+            self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for path in self.cache_dir.glob("*.ubj"):
+                path.unlink(missing_ok=True)
+
+    def _remember(self, key: str, model: XGBRegressor, nbytes: int):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        if nbytes > self.max_memory_bytes:
+            return
+        self._memory[key] = (model, nbytes)
+        self._memory_bytes += nbytes
+        while self._memory_bytes > self.max_memory_bytes:
+            self._memory_bytes -= self._memory.popitem(last=False)[1][1]
+
+    def _evict_disk(self):
+        files = []
+        for path in self.cache_dir.glob("*.ubj"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+
+# next to the data the models are fitted on, i.e. in SALES_DATA_DIR if set
+model_cache = ModelCache(df_parquet_path.parent / "demo_sales_models")
@@ -0,0 +1,136 @@
+"""Background prefetch of the data a scenario will need, before it is submitted.
+
+The Create page knows the store and week well before Submit is clicked. `prefetch_store` then loads, in a thread pool,
+the store's history and whatever the forecasters would read from disk: precomputed features and cached models. The
+loaded frames are kept in `prefetch_cache`, which `tpconfig.tp_get_store_df` and the forecasters read first (cached
+models being kept by `algo.model_cache`). Starting a new prefetch cancels the previous one.
+"""
+
+import datetime as dt
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Hashable, Optional, Sequence
+
+import pandas as pd
+
+from db.crud import df_source_mtime, read_df
+
+# total size of the frames kept by prefetch_cache, e.g. a few stores' history and training matrices
+PREFETCH_CACHE_MAX_BYTES = 256 * 2**20
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+
+class PrefetchCache:
+    """LRU of the frames loaded by prefetches, at most max_bytes in total.
+
+    Keys include the version of the data (see `store_df_key`), so that frames read before the data changed are not
+    served. Values are shared with every reader, which must not modify them.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        with self._lock:
+            if key in self._items:
+                self._nbytes -= self._items.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._items[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                self._nbytes -= self._items.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
+
+
+prefetch_cache = PrefetchCache(PREFETCH_CACHE_MAX_BYTES)
+
+
+def store_df_key(store_id: str, end: dt.date | dt.datetime) -> tuple:
+    """Key of `read_df(store_id, end=end)` in prefetch_cache."""
+
+    return "store_df", store_id, pd.Timestamp(end), df_source_mtime()
+
+
+def training_matrices_key(store_id: str, end: dt.date | dt.datetime) -> tuple:
+    """Key of `algo.feature_store.read_training_matrices(store_id, end=end)` in prefetch_cache."""
+
+    return "training_matrices", store_id, pd.Timestamp(end), df_source_mtime()
+
+
+class Prefetch:
+    """Handle of a prefetch running in the thread pool."""
+
+    def __init__(self, store_id: str, week_start: dt.date):
+        self.store_id = store_id
+        self.week_start = week_start
+        self.future: Optional[Future] = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Cancel the prefetch if it has not started, otherwise stop it before its next step."""
+
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def run(self, keys: Sequence[str]):
+        # imported here, algo.registry depending on this module
+        from algo.registry import forecasters
+
+        dates = [self.week_start + dt.timedelta(days=n) for n in range(7)]
+        cache_key = store_df_key(self.store_id, self.week_start)
+        store_df = prefetch_cache.get(cache_key)
+        if store_df is None:
+            store_df = read_df(self.store_id, end=self.week_start)  # as in tpconfig.tp_get_store_df
+            prefetch_cache.put(cache_key, store_df, store_df.memory_usage().sum())
+        for key in keys:
+            if self.cancelled:
+                return
+            forecasters[key].prefetch(store_df, self.store_id, dates, cancelled=lambda: self.cancelled)
+
+
+_current: Optional[Prefetch] = None
+_lock = threading.Lock()
+
+
+def prefetch_store(store_id: str, week_start: dt.date, keys: Sequence[str]) -> Prefetch:
+    """Prefetch what a scenario of store_id for the week of week_start needs to run the forecasters of keys.
+
+    Any other prefetch in progress is cancelled. Prefetching is best effort: errors are left in the returned handle's
+    future and never raised.
+    """
+
+    global _current
+
+    with _lock:
+        if _current is not None:
+            # a finished prefetch is run again, its frames being cached unless the data changed since
+            same_store_week = (_current.store_id, _current.week_start) == (store_id, week_start)
+            if same_store_week and not (_current.cancelled or _current.future.done()):
+                return _current
+            _current.cancel()
+
+        _current = Prefetch(store_id, week_start)
+        _current.future = _executor.submit(_current.run, keys)
+        return _current
@@ -0,0 +1,309 @@
+"""Registry of the forecasting models run over all series of a store."""
+
+import datetime as dt
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterator, Sequence
+
+import numpy as np
+import pandas as pd
+
+from algo.feature_store import read_training_matrices
+from algo.forecast import (
+    fit_xgb,
+    fit_xgb_global,
+    forecast_last_week,
+    forecast_sma,
+    forecast_xgb,
+    forecast_xgb_global,
+    forecast_xgb_what_if,
+    get_cached_xgb,
+)
+from algo.prefetch import prefetch_cache, training_matrices_key
+
+# forecast column names, in data_df and in the metrics of the pages
+FCST_SMA_KEY = "forecast_sma"
+FCST_LAST_WEEK_KEY = "forecast_last_week"
+FCST_XGB_KEY = "forecast_xgb"
+FCST_XGB_GLOBAL_KEY = "forecast_xgb_global"
+
+_series_cols = ["start_time", "section", "indicator"]
+
+
+def _iter_series(store_df: pd.DataFrame) -> Iterator[tuple[tuple[str, str], pd.DataFrame]]:
+    """Yield ((section, indicator), df) for every series of store_df, df holding start_time, value and the features."""
+
+    for section_indicator, _df in store_df.groupby(by=["section", "indicator"], observed=True):
+        yield section_indicator, _df.drop(columns=["store_id", "section", "indicator"], errors="ignore")
+
+
+def _base(array: np.ndarray) -> np.ndarray:
+    """The array that owns the memory of array, a view or not."""
+
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+class Forecaster(ABC):
+    """A forecasting model that is fitted and predicts over all section/indicator series of a store at once.
+
+    Subclasses implement `predict_many` and, if the model is trained, `fit_many`. The forecast is returned in a column
+    named `key`.
+    """
+
+    # whether the forecast depends on the business features passed to `predict_many`
+    uses_business_features = True
+
+    def __init__(self, key: str, label: str):
+        self.key = key
+        self.label = label
+
+    def fit_many(self, store_df: pd.DataFrame, store_id: str, dates: Sequence[dt.date]) -> Any:
+        """Fit on every series of store_df and return what `predict_many` needs (None for models without training)."""
+
+        return None
+
+    def prefetch(
+        self,
+        store_df: pd.DataFrame,
+        store_id: str,
+        dates: Sequence[dt.date],
+        cancelled: Callable[[], bool] = lambda: False,
+    ):
+        """Load what `fit_many` would read from disk for the same arguments, without fitting. No-op by default.
+
+        Stops early once cancelled() returns True.
+        """
+
+    @abstractmethod
+    def predict_many(
+        self, fitted: Any, store_df: pd.DataFrame, dates: Sequence[dt.date], features: dict[str, Any]
+    ) -> pd.DataFrame:
+        """Forecast every series of store_df for dates.
+
+        Returns a DataFrame with columns start_time, section, indicator and `key`.
+        """
+
+    def predict_what_if(
+        self, fitted: Any, store_df: pd.DataFrame, dates: Sequence[dt.date], feature_grid: Sequence[dict[str, Any]]
+    ) -> pd.DataFrame:
+        """Forecast every series of store_df for dates, for every combination of business features of feature_grid.
+
+        Returns a DataFrame with columns start_time, section, indicator, the columns of feature_grid and `key`. By
+        default, `predict_many` is called once per combination.
+        """
+
+        dfs = [
+            self.predict_many(fitted, store_df, dates, features).assign(**features) for features in feature_grid
+        ]
+        return pd.concat(dfs, ignore_index=True)
+
+
+class SeriesForecaster(Forecaster):
+    """Wraps a forecast function of a single series without training, e.g. `forecast_sma`."""
+
+    uses_business_features = False
+
+    def __init__(self, key: str, label: str, forecast_func: Callable[..., pd.Series]):
+        super().__init__(key, label)
+        self.forecast_func = forecast_func
+
+    def predict_many(self, fitted, store_df, dates, features):
+        dfs = []
+        for (section, indicator), _df in _iter_series(store_df):
+            fcst = self.forecast_func(_df.set_index("start_time").value, dates=dates)
+            dfs.append(fcst.rename(self.key).reset_index().assign(section=section, indicator=indicator))
+        return pd.concat(dfs, ignore_index=True)[[*_series_cols, self.key]]
+
+    def predict_what_if(self, fitted, store_df, dates, feature_grid):
+        # the forecast does not depend on the business features
+        fcst_df = self.predict_many(fitted, store_df, dates, {})
+        return fcst_df.merge(pd.DataFrame(list(feature_grid)), how="cross")
+
+
+class XGBForecaster(Forecaster):
+    """One XGB model per series, see `forecast_xgb`."""
+
+    def __init__(
+        self,
+        key: str,
+        label: str,
+        strategy: str = "recursive",
+        warm_start: bool = False,
+        full_retrain_interval: int = 4,
+        use_feature_store: bool = False,
+    ):
+        super().__init__(key, label)
+        self.strategy = strategy
+        self.warm_start = warm_start
+        self.full_retrain_interval = full_retrain_interval
+        # train on the precomputed features of algo.feature_store (recursive strategy only)
+        self.use_feature_store = use_feature_store
+
+    def fit_many(self, store_df, store_id, dates):
+        training_matrices = {}
+        if self.use_feature_store and self.strategy == "recursive":
+            end = store_df["start_time"].max()
+            training_matrices = prefetch_cache.get(training_matrices_key(store_id, end))
+            if training_matrices is None:
+                training_matrices = read_training_matrices(store_id, end=end)
+
+        return {
+            section_indicator: fit_xgb(
+                _df,
+                dates,
+                cache_key=(store_id, *section_indicator),
+                strategy=self.strategy,
+                warm_start=self.warm_start,
+                full_retrain_interval=self.full_retrain_interval,
+                training_matrix=training_matrices.get(section_indicator),
+            )
+            for section_indicator, _df in _iter_series(store_df)
+        }
+
+    def prefetch(self, store_df, store_id, dates, cancelled=lambda: False):
+        if self.use_feature_store and self.strategy == "recursive":
+            end = store_df["start_time"].max()
+            key = training_matrices_key(store_id, end)
+            if prefetch_cache.get(key) is None:
+                training_matrices = read_training_matrices(store_id, end=end)
+                # the matrices of all series are views into the same arrays
+                bases = {id(base): base for X_y in training_matrices.values() for base in map(_base, X_y)}
+                prefetch_cache.put(key, training_matrices, sum(base.nbytes for base in bases.values()))
+        for section_indicator, _df in _iter_series(store_df):
+            if cancelled():
+                return
+            get_cached_xgb(
+                _df, (store_id, *section_indicator), dates, strategy=self.strategy, warm_start=self.warm_start
+            )
+
+    def predict_many(self, fitted, store_df, dates, features):
+        dfs = []
+        for (section, indicator), _df in _iter_series(store_df):
+            fcst = forecast_xgb(
+                _df, dates=dates, features=features, strategy=self.strategy, xgb=fitted[(section, indicator)]
+            )
+            dfs.append(fcst.rename(self.key).reset_index().assign(section=section, indicator=indicator))
+        return pd.concat(dfs, ignore_index=True)[[*_series_cols, self.key]]
+
+    def predict_what_if(self, fitted, store_df, dates, feature_grid):
+        dfs = []
+        for (section, indicator), _df in _iter_series(store_df):
+            what_if_df = forecast_xgb_what_if(
+                _df, dates, feature_grid, fitted[(section, indicator)], strategy=self.strategy
+            )
+            dfs.append(what_if_df.rename(columns={"value": self.key}).assign(section=section, indicator=indicator))
+        return pd.concat(dfs, ignore_index=True)
+
+
+class XGBGlobalForecaster(Forecaster):
+    """A single XGB model for all series of the store, see `forecast_xgb_global`."""
+
+    def fit_many(self, store_df, store_id, dates):
+        return fit_xgb_global(store_df)
+
+    def predict_many(self, fitted, store_df, dates, features):
+        fcst_df = forecast_xgb_global(store_df, dates=dates, features=features, xgb=fitted)
+        return fcst_df.rename(columns={"value": self.key})[[*_series_cols, self.key]]
+
+
+forecasters: dict[str, Forecaster] = {}
+
+# options of the per-series XGB model (FCST_XGB_KEY), see algo.forecast.forecast_xgb
+# strategy is "recursive" or "direct"; warm_start continues boosting the cached model of the previous week instead of
+# fitting from scratch, with a full fit every XGB_FULL_RETRAIN_INTERVAL weeks
+XGB_STRATEGY = "recursive"
+XGB_WARM_START = False
+XGB_FULL_RETRAIN_INTERVAL = 4
+# train on the features materialized by algo.feature_store instead of recomputing them for every scenario
+XGB_USE_FEATURE_STORE = True
+
+
+def register_forecaster(forecaster: Forecaster) -> Forecaster:
+    """Register forecaster under its key, replacing any forecaster with the same key."""
+
+    forecasters[forecaster.key] = forecaster
+    return forecaster
+
+
+register_forecaster(SeriesForecaster(FCST_SMA_KEY, "SMA", forecast_sma))
+register_forecaster(SeriesForecaster(FCST_LAST_WEEK_KEY, "Last Week", forecast_last_week))
+register_forecaster(
+    XGBForecaster(
+        FCST_XGB_KEY,
+        "XGB",
+        strategy=XGB_STRATEGY,
+        warm_start=XGB_WARM_START,
+        full_retrain_interval=XGB_FULL_RETRAIN_INTERVAL,
+        use_feature_store=XGB_USE_FEATURE_STORE,
+    )
+)
+register_forecaster(XGBGlobalForecaster(FCST_XGB_GLOBAL_KEY, "XGB (global)"))
+
+
+def run_forecasters(
+    keys: Sequence[str], store_df: pd.DataFrame, store_id: str, dates: Sequence[dt.date], features: dict[str, Any]
+) -> tuple[pd.DataFrame, dict[str, dict[str, float]]]:
+    """Fit and run the forecasters of keys on every series of store_df.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns start_time, section, indicator and one column per key.
+    dict[str, dict[str, float]]
+        Per key, the seconds spent in fit_many and predict_many, e.g. {"forecast_sma": {"fit": 0.0, "predict": 0.1}}.
+    """
+
+    fcst_df = None
+    timings = {}
+    for key in keys:
+        forecaster = forecasters[key]
+
+        start = time.perf_counter()
+        fitted = forecaster.fit_many(store_df, store_id, dates)
+        fit_end = time.perf_counter()
+        _fcst_df = forecaster.predict_many(fitted, store_df, dates, features)
+        timings[key] = {"fit": fit_end - start, "predict": time.perf_counter() - fit_end}
+
+        _fcst_df = _fcst_df.astype({"section": str, "indicator": str})
+        fcst_df = _fcst_df if fcst_df is None else fcst_df.merge(_fcst_df, on=_series_cols, how="left")
+
+    return fcst_df, timings
+
+
+def run_forecasters_what_if(
+    keys: Sequence[str],
+    store_df: pd.DataFrame,
+    store_id: str,
+    dates: Sequence[dt.date],
+    feature_grid: Sequence[dict[str, Any]],
+) -> tuple[pd.DataFrame, dict[str, dict[str, float]]]:
+    """Like `run_forecasters`, for every combination of business features of feature_grid.
+
+    Each model is fitted once, see `Forecaster.predict_what_if`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns start_time, section, indicator, the columns of feature_grid and one column per key.
+    dict[str, dict[str, float]]
+        As in `run_forecasters`, predict covering all combinations.
+    """
+
+    merge_cols = [*_series_cols, *pd.DataFrame(list(feature_grid)).columns]
+    what_if_df = None
+    timings = {}
+    for key in keys:
+        forecaster = forecasters[key]
+
+        start = time.perf_counter()
+        fitted = forecaster.fit_many(store_df, store_id, dates)
+        fit_end = time.perf_counter()
+        _what_if_df = forecaster.predict_what_if(fitted, store_df, dates, feature_grid)
+        timings[key] = {"fit": fit_end - start, "predict": time.perf_counter() - fit_end}
+
+        _what_if_df = _what_if_df.astype({"section": str, "indicator": str})[[*merge_cols, key]]
+        what_if_df = _what_if_df if what_if_df is None else what_if_df.merge(_what_if_df, on=merge_cols, how="left")
+
+    return what_if_df, timings
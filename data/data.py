@@ -2,18 +2,29 @@ import numpy as np
 import pandas as pd
 from scipy.stats import skewnorm
 import datetime as dt
-import itertools, math, warnings
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from dateutil.relativedelta import relativedelta, MO
+from pandas.api.types import union_categoricals
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-np.random.seed(0)
+# every store draws from its own stream, derived from this seed and its position (see _store_rng)
+_DEFAULT_SEED = 0
 
 _freq = dt.timedelta(minutes=30)
 _sample_sections = ["MAINS", "SIDES", "BEVERAGE"]
 _sample_indicators = ["Transactions"]  # we will generate "Items" and "Sales", based on "Transactions"
+_indicators = [*_sample_indicators, "Items", "Sales"]
 
 _default_beverage_size = 500
 _default_mains_size = 1500
 _default_sides_size = 1000
+_default_section_sizes = {"MAINS": _default_mains_size, "SIDES": _default_sides_size, "BEVERAGE": _default_beverage_size}
 
 # the following multipliers will be randomised from a normal distribution with scale mu/10
 _STD_PCT_OF_MEAN = 0.1
@@ -21,11 +32,39 @@ _weekend_multiplier = 1.6
 _default_items_multiplier = 2.5  # based on "Transactions"
 _default_sales_multiplier = 3.5 * 100  # based on "Items", expressed in cents
 
+_promo_chance = 0.3
+_promo_multiplier = 1.3
 
-def _generate_sales_distribution(target_total_sum):
-    """Generate a sales distribution.
+# rows per row group of the generated dataset, as db.crud.DATASET_ROW_GROUP_SIZE
+_DATASET_ROW_GROUP_SIZE = 16 * 1024
 
-    The sum of the distribution will be `target_total_sum` at max, often less (due to truncating floating points).
+
+def _store_rng(store_index: int, seed: int = _DEFAULT_SEED) -> np.random.Generator:
+    """Random stream of the store_index-th store, independent of the other stores and of how many are generated."""
+
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(store_index,)))
+
+
+def _histograms(samples: np.ndarray, group_sizes: np.ndarray, bins: int) -> np.ndarray:
+    """np.histogram(group, bins=bins) of each group of consecutive samples, as an array of shape (n_groups, bins)."""
+
+    assert (group_sizes > 0).all(), "empty group"
+
+    group_starts = np.cumsum(group_sizes) - group_sizes
+    low = np.minimum.reduceat(samples, group_starts)
+    high = np.maximum.reduceat(samples, group_starts)
+
+    # bins span [min, max] of each group, the last one including max
+    bin_ids = ((samples - np.repeat(low, group_sizes)) * np.repeat(bins / (high - low), group_sizes)).astype(np.intp)
+    np.minimum(bin_ids, bins - 1, out=bin_ids)
+    bin_ids += np.repeat(np.arange(len(group_sizes)) * bins, group_sizes)
+    return np.bincount(bin_ids, minlength=len(group_sizes) * bins).reshape(-1, bins)
+
+
+def _generate_sales_distributions(rng: np.random.Generator, target_total_sums: np.ndarray) -> np.ndarray:
+    """Generate a daily sales distribution per element of target_total_sums, as an array of shape (n_days, bins).
+
+    The sum of each distribution will be its target total at max, often less (due to truncating floating points).
     """
 
     size = 5000
@@ -33,163 +72,203 @@ def _generate_sales_distribution(target_total_sum):
     assert pd.Timedelta(days=1) / _freq == bins
     mu = 100
     _n = size / 1.375  # 1 from midday peak, 0.375 (1/2 * 0.75) from dinner peak
-    n = int(np.random.normal(_n, _n / 10))
-    arr = np.random.normal(mu, mu / 50, size=n)
+    n = rng.normal(_n, _n / 10, size=len(target_total_sums)).astype(int)
+    n_dinner = (n / 2).astype(int)
 
-    midday_peak, _ = np.histogram(arr, bins=bins)
-    dinner_peak, _ = np.histogram(skewnorm.rvs(-3, loc=mu, scale=mu / 10, size=int(n / 2)), bins=int(bins / 2))
-    dinner_peak_padded = np.hstack((np.zeros(int(bins / 2)), dinner_peak * 0.75))
+    # float32 is plenty for binning, and twice as fast to draw
+    midday_samples = rng.standard_normal(size=n.sum(), dtype=np.float32) * np.float32(mu / 50) + np.float32(mu)
+    midday_peak = _histograms(midday_samples, n, bins)
+    dinner_samples = skewnorm.rvs(-3, loc=mu, scale=mu / 10, size=n_dinner.sum(), random_state=rng)
+    dinner_peak = _histograms(dinner_samples, n_dinner, int(bins / 2))
 
-    arr = midday_peak + dinner_peak_padded
+    arr = midday_peak.astype(float)
+    arr[:, int(bins / 2) :] += dinner_peak * 0.75
 
-    arr *= target_total_sum / np.sum(arr)
-    arr = arr.astype(int)
+    arr *= (target_total_sums / arr.sum(axis=1))[:, np.newaxis]
+    return arr.astype(int)
 
-    return arr
 
+def _generate_store(
+    store_id: str, store_index: int, start_date: dt.date, end_date: dt.date, seed: int = _DEFAULT_SEED
+) -> pd.DataFrame:
+    """Generate the data of a store, with the random stream of store_index (see _store_rng). end_date is inclusive.
 
-def _generate_transactions_for_indicator(start_date: dt.date, end_date: dt.date, size: int) -> pd.DataFrame:
-    "end_date is inclusive"
+    All days, weeks, sections and indicators are drawn at once. Rows are ordered by week, section, indicator and
+    start_time.
+    """
 
-    end_date = end_date + dt.timedelta(days=1)
-    date_range = pd.date_range(start_date, end_date, freq=_freq, name="start_time", inclusive="left")
+    rng = _store_rng(store_index, seed)
 
-    sales_distribution_list = []
-    date_list = date_range.to_series().dt.date.unique()
-    for date in date_list:
-        _size = size
-        if date.weekday() in [5, 6]:
-            _size = _size * np.random.normal(_weekend_multiplier, _STD_PCT_OF_MEAN * _weekend_multiplier)
-        sales_distribution = _generate_sales_distribution(_size).astype(int)
-        sales_distribution_list.append(sales_distribution)
+    start_times = pd.date_range(start_date, end_date + dt.timedelta(days=1), freq=_freq, inclusive="left")
+    days = pd.date_range(start_date, end_date, freq="D")
+    n_sections, n_days, n_slots = len(_sample_sections), len(days), len(start_times)
 
-    df = pd.DataFrame(index=date_range, data={"value": np.hstack(sales_distribution_list)})
-    return df
+    # (section, day) -> transactions of the day
+    store_multipliers = rng.random(n_sections) + 0.5
+    sizes = np.array([_default_section_sizes[section] for section in _sample_sections]) * store_multipliers
+    weekend_multipliers = rng.normal(
+        _weekend_multiplier, _STD_PCT_OF_MEAN * _weekend_multiplier, size=(n_sections, n_days)
+    )
+    day_sizes = np.where(days.weekday.isin([5, 6]), sizes[:, np.newaxis] * weekend_multipliers, sizes[:, np.newaxis])
+
+    transactions = _generate_sales_distributions(rng, day_sizes.ravel()).reshape(n_sections, n_slots)
+    items_multipliers = rng.normal(
+        _default_items_multiplier, _STD_PCT_OF_MEAN * _default_items_multiplier, size=(n_sections, n_slots)
+    )
+    items = (transactions * items_multipliers).astype(int)
+    sales_multipliers = rng.normal(
+        _default_sales_multiplier, _STD_PCT_OF_MEAN * _default_sales_multiplier, size=(n_sections, n_slots)
+    )
+    sales = (items * sales_multipliers).astype(int)
+    values = np.stack([transactions, items, sales], axis=1)  # (section, indicator, slot)
+
+    # sample from 2023 and 2024 separately so 30% of the in-sample forecast (which occurs in 2024) will be promos
+    weeks = start_times.to_period("W-SUN").start_time
+    week_codes, week_starts = pd.factorize(weeks)
+    promo_weeks = []
+    for year in [2023, 2024]:
+        year_weeks = week_starts[week_starts.year == year]
+        promo_weeks.extend(rng.choice(year_weeks, math.ceil(len(year_weeks) * _promo_chance), replace=False))
+    promo = weeks.isin(promo_weeks).astype(np.int64)
+    values = np.where(promo == 1, (values * _promo_multiplier).astype(int), values)
+
+    # pollution (0-5, 0 being no pollution) affects the data as a multiplier of 1-(pollution/10), drawn per week
+    week_pollution = np.ceil((1 - np.cbrt(rng.random(len(week_starts)))) * 6) - 1
+    pollution = week_pollution[week_codes]
+    values = (values * (1 - (pollution / 10))).astype(int)
+
+    n_series = n_sections * len(_indicators)
+    store_df = pd.DataFrame({
+        "store_id": pd.Categorical.from_codes(np.zeros(n_series * n_slots, dtype=int), categories=[store_id]),
+        "start_time": np.tile(start_times, n_series),
+        "section": pd.Categorical.from_codes(
+            np.repeat(np.arange(n_sections), len(_indicators) * n_slots), categories=_sample_sections
+        ),
+        "indicator": pd.Categorical.from_codes(
+            np.tile(np.repeat(np.arange(len(_indicators)), n_slots), n_sections), categories=_indicators
+        ),
+        "value": values.ravel().astype(np.int64),
+        "promo": np.tile(promo, n_series),
+        "pollution": np.tile(pollution, n_series),
+    })
+    for col in ["section", "indicator"]:
+        store_df[col] = store_df[col].cat.reorder_categories(sorted(store_df[col].cat.categories))
+
+    order = np.argsort(np.tile(week_codes, n_series), kind="stable")
+    return store_df.take(order).reset_index(drop=True)
+
+
+def _date_range() -> tuple[dt.date, dt.date]:
+    """First and last (inclusive) day of the generated data."""
+
+    # First Monday in 2023
+    start_date = dt.date(2023, 1, 1)
+    start_date = start_date + relativedelta(weekday=MO(+1))
+    # end date is the Sunday of the final week (beginning Monday) for March 2024
+    end_date = dt.date(2024, 3, 31)
+    end_date = end_date + relativedelta(weekday=MO(-1))
+    end_date = end_date + dt.timedelta(days=6)
+    return start_date, end_date
 
 
-def _generate_items_from_transactions(transactions_df: pd.DataFrame, base_multiplier: float) -> pd.DataFrame:
-    items_df = transactions_df.copy()
-    multiplier_array = np.random.normal(base_multiplier, _STD_PCT_OF_MEAN * base_multiplier, len(items_df))
-    items_df["value"] = (items_df["value"] * multiplier_array).astype(int)
-    return items_df
+def _store_ids(n_stores: int) -> list[str]:
+    return [f"{i+1:03}" for i in range(n_stores)]
 
 
-def _generate_sales_from_items(items_df: pd.DataFrame, base_multiplier: float) -> pd.DataFrame:
-    sales_df = items_df.copy()
-    multiplier_array = np.random.normal(base_multiplier, _STD_PCT_OF_MEAN * base_multiplier, len(sales_df))
-    sales_df["value"] = (sales_df["value"] * multiplier_array).astype(int)
-    return sales_df
+def get_data(n_stores: int = 10, seed: int = _DEFAULT_SEED) -> pd.DataFrame:
+    """Generate data for n_stores stores.
 
+    The data of a store only depends on seed and its position, so the first stores are the same whatever n_stores.
+    """
 
-def _generate_actual_df(store_list: list[str], start_date: dt.date, end_date: dt.date) -> pd.DataFrame:
-    dfs = []
+    start_date, end_date = _date_range()
 
-    for store_id, zone in itertools.product(store_list, _sample_sections):
-        store_multiplier = np.random.rand() + 0.5
-        if zone == "MAINS":
-            size = _default_mains_size * store_multiplier
-        elif zone == "SIDES":
-            size = _default_sides_size * store_multiplier
-        elif zone == "BEVERAGE":
-            size = _default_beverage_size * store_multiplier
-        else:
-            raise ValueError(f"Unknown zone: {zone}")
+    dfs = [
+        _generate_store(store_id, store_index, start_date, end_date, seed)
+        for store_index, store_id in enumerate(_store_ids(n_stores))
+    ]
+    store_ids = union_categoricals([df["store_id"] for df in dfs])
+    actual_df = pd.concat([df.drop(columns="store_id") for df in dfs], ignore_index=True)
+    actual_df.insert(0, "store_id", store_ids)
+    return actual_df
 
-        transactions_df = _generate_transactions_for_indicator(start_date, end_date, size=size)
-        transactions_df["store_id"] = store_id
-        transactions_df["section"] = zone
-        transactions_df["indicator"] = "Transactions"
 
-        items_df = _generate_items_from_transactions(transactions_df, _default_items_multiplier)
-        items_df["store_id"] = store_id
-        items_df["section"] = zone
-        items_df["indicator"] = "Items"
+def _write_store(store_id: str, store_index: int, path: Path, seed: int, row_group_size: int) -> int:
+    """Generate a store and write it as the partition store_id=<store_id>/part-0.parquet of the dataset at path.
 
-        sales_df = _generate_sales_from_items(items_df, _default_sales_multiplier)
-        sales_df["store_id"] = store_id
-        sales_df["section"] = zone
-        sales_df["indicator"] = "Sales"
+    Rows are sorted by start_time, as in the layout of db.crud.write_dataset. Returns the number of rows.
+    """
 
-        dfs.append(transactions_df)
-        dfs.append(items_df)
-        dfs.append(sales_df)
+    store_df = _generate_store(store_id, store_index, *_date_range(), seed=seed)
+    table = pa.Table.from_pandas(
+        store_df.drop(columns="store_id").sort_values("start_time", kind="stable"), preserve_index=False
+    )
 
-    actual_df = pd.concat(dfs).reset_index().reset_index(drop=True)
-    actual_df = actual_df.loc[:, ["start_time", "store_id", "section", "indicator", "value"]]
-    actual_df.store_id = actual_df.store_id.astype("category")
-    actual_df.section = actual_df.section.astype("category")
-    actual_df.indicator = actual_df.indicator.astype("category")
-    return actual_df
+    partition_path = path / f"store_id={store_id}"
+    partition_path.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, partition_path / "part-0.parquet", row_group_size=row_group_size)
+    return len(table)
 
 
-def get_data(n_stores: int = 10) -> pd.DataFrame:
-    """Generate data for n_stores stores."""
+def write_dataset(
+    path: Path,
+    n_stores: int,
+    n_workers: int = 1,
+    seed: int = _DEFAULT_SEED,
+    row_group_size: int = _DATASET_ROW_GROUP_SIZE,
+) -> int:
+    """Generate n_stores stores in n_workers processes, written as a hive-partitioned dataset at path (replaced).
 
-    sample_stores = [f"{i+1:03}" for i in range(n_stores)]
+    Each worker generates and writes one store at a time, so peak memory does not depend on n_stores, and the data is
+    the same as get_data(n_stores, seed) whatever n_workers. Returns the number of rows.
+    """
 
-    # First Monday in 2023
-    start_date = dt.date(2023, 1, 1)
-    start_date = start_date + relativedelta(weekday=MO(+1))
-    # end date is the Sunday of the final week (beginning Monday) for March 2024
-    end_date = dt.date(2024, 3, 31)
-    end_date = end_date + relativedelta(weekday=MO(-1))
-    end_date = end_date + dt.timedelta(days=6)
-    actual_df = _generate_actual_df(sample_stores, start_date, end_date)
-
-    actual_df["week"] = actual_df["start_time"].dt.to_period("W-SUN").dt.start_time
-    promo_chance = 0.3
-    promo_multiplier = 1.3
-
-    def apply_promo(df: pd.DataFrame) -> pd.DataFrame:
-        promo_df = df.reset_index().copy()
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            weeks_in_2023 = list(promo_df[promo_df.week.dt.year == 2023].week.drop_duplicates().dt.to_pydatetime())
-            weeks_in_2024 = list(promo_df[promo_df.week.dt.year == 2024].week.drop_duplicates().dt.to_pydatetime())
-
-        # sample from 2023 and 2024 separately so 30% of the in-sample forecast (which occurs in 2024) will be promos
-        promo_week_list = sorted(
-            np.random.choice(weeks_in_2023, math.ceil(len(weeks_in_2023) * promo_chance), replace=False)
-        )
-        promo_week_list += sorted(
-            np.random.choice(weeks_in_2024, math.ceil(len(weeks_in_2024) * promo_chance), replace=False)
+    # published as a new version of the dataset, which may be read meanwhile (see db.crud.publish_version)
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from db.crud import _lock_path, new_version_path, publish_version
+    from utils.utils import file_lock
+
+    version_path = new_version_path(path)
+    version_path.mkdir(parents=True)
+
+    store_ids = _store_ids(n_stores)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        n_rows = sum(
+            executor.map(
+                _write_store,
+                store_ids,
+                range(n_stores),
+                [version_path] * n_stores,
+                [seed] * n_stores,
+                [row_group_size] * n_stores,
+            )
         )
 
-        promo_df["promo"] = 0
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            promo_df.loc[pd.Series(promo_df.week.dt.to_pydatetime()).isin(promo_week_list), "promo"] = 1
-
-        promo_df.loc[promo_df.promo == 1, "value"] = (
-            promo_df.loc[promo_df.promo == 1, "value"] * promo_multiplier
-        ).astype(int)
-        return promo_df
-
-    actual_df = (
-        actual_df.groupby(by="store_id", observed=True)
-        .apply(apply_promo, include_groups=False)
-        .reset_index(0)
-        .set_index("index", drop=True)
-    )
+    os.utime(version_path)  # see db.crud.df_source_mtime
+    with file_lock(_lock_path(path)):
+        publish_version(path, version_path)
+    return n_rows
+
+
+if __name__ == "__main__":
+    import argparse
 
-    def apply_pollution(df: pd.DataFrame) -> pd.DataFrame:
-        """Apply pollution (0-5) to the data.
-
-        Pollution is a value between 0-5, where 0 is no pollution and 5 is maximum pollution. Pollution affects the data
-        as a multiplier to the value, where the multiplier is 1-(pollution/10).
-        """
-        pollution_df = df.reset_index().copy()
-        pollution = np.ceil((1 - np.cbrt(np.random.rand())) * 6) - 1
-        pollution_multiplier = 1 - (pollution / 10)
-        pollution_df["pollution"] = pollution
-        pollution_df["value"] = (pollution_df["value"] * pollution_multiplier).astype(int)
-        return pollution_df
-
-    actual_df = (
-        actual_df.groupby(by=["store_id", "week"], observed=True)
-        .apply(apply_pollution, include_groups=False)
-        .reset_index(0)
-        .set_index("index", drop=True)
+    parser = argparse.ArgumentParser(description="Generate the sales data as a hive-partitioned Parquet dataset.")
+    parser.add_argument("--stores", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=_DEFAULT_SEED)
+    parser.add_argument("--row-group-size", type=int, default=_DATASET_ROW_GROUP_SIZE)
+    parser.add_argument(
+        "--output", type=Path, help="default: the dataset read by db.crud.read_df, in SALES_DATA_DIR if it is set"
     )
+    args = parser.parse_args()
+
+    if args.output is None:
+        sys.path.insert(0, str(Path(__file__).parent.parent))
+        from db.crud import df_dataset_path
+
+        args.output = df_dataset_path
 
-    return actual_df
\ No newline at end of file
+    start = time.perf_counter()
+    n_rows = write_dataset(args.output, args.stores, args.workers, args.seed, args.row_group_size)
+    print(f"{n_rows} rows of {args.stores} stores written to {args.output} in {time.perf_counter() - start:.1f}s")
@@ -1,43 +1,546 @@
 """Exposes the public API for reading the sales data."""
 
+import datetime as dt
+import json
+import os
+import shutil
+import threading
+import time
 from collections import defaultdict
-from functools import cache
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
 
-from utils.utils import TIME_STEP
+from utils.utils import TIME_STEP, file_lock
 import sys
 
 
-df_parquet_path = Path(__file__).parent.parent / "data" / "demo_sales_data.parquet"
-print(df_parquet_path)
+# the files derived from the sales data are written next to it, in the directory that SALES_DATA_DIR overrides (e.g. in
+# the tests)
+_data_dir = Path(os.environ.get("SALES_DATA_DIR", Path(__file__).parent.parent / "data"))
+df_parquet_path = _data_dir / "demo_sales_data.parquet"
 
-def read_df(
-    store_id: Optional[str] = None,
-    section_indicator: Optional[tuple[str, str]] = None,
-) -> pd.DataFrame:
+# hive-partitioned layout of the same data (see write_dataset), read instead of df_parquet_path if it exists
+df_dataset_path = df_parquet_path.parent / "demo_sales_dataset"
+# rows per row group of the partitioned layout: small enough for start_time statistics to skip most of a store's
+# history, large enough to keep the metadata small (a store with 9 series has 3024 rows per week)
+DATASET_ROW_GROUP_SIZE = 16 * 1024
+# append_df compacts a partition once it holds more fragments than this
+DATASET_MAX_FRAGMENTS = 16
+
+# read_df keeps the decoded dataset in memory, unless it is larger than this
+READ_CACHE_MAX_BYTES = 512 * 2**20
+
+# with USE_IPC_STORE, read_df serves slices of an uncompressed Arrow IPC (Feather v2) copy of the Parquet data, which
+# is memory-mapped instead of decoded, so that all processes share one page-cached copy (see write_ipc)
+USE_IPC_STORE = False
+df_ipc_path = df_parquet_path.with_suffix(".arrow")
+_SORTED_METADATA_KEY = b"sorted_by"
+
+# with USE_SQLITE_STORE, read_df queries a SQLite copy of the Parquet data indexed by series and start_time instead
+# (see db.sqlite), so that processes do not each hold the decoded dataset in memory
+USE_SQLITE_STORE = False
+
+# sidecar index of the store -> section -> indicator tree, see get_tree_mappings
+tree_index_path = df_parquet_path.parent / "demo_sales_tree.json"
+
+df_columns = ["store_id", "start_time", "section", "indicator", "value", "promo", "pollution"]
+_series_cols = ["store_id", "section", "indicator"]
+
+
+# directories of files derived from the sales data that are rewritten while being read (the partitioned dataset, the
+# feature store...) are versioned: see publish_version. A retired version is removed this long after it was replaced.
+RETIRED_VERSION_SECONDS = 60
+_RETIRED_MARKER = "_retired"  # dataset discovery ignores names starting with "_"
+
+
+def new_version_path(path: Path) -> Path:
+    """Hidden directory, next to path, to write the next version of the directory at path in (see publish_version)."""
+
+    return path.with_name(f".{path.name}.{time.time_ns()}.{os.getpid()}")
+
+
+def publish_version(path: Path, version_path: Path):
+    """Make the directory version_path (see new_version_path) the current version of path, with a single rename.
+
+    path is a symbolic link to its current version, which is replaced atomically: readers that resolve path once (e.g.
+    `path.resolve()`) and then only read from the version it points to see either version in full, never a mix of
+    both. Retired versions are marked, and removed by a later publish once they are RETIRED_VERSION_SECONDS old, so
+    that readers of a retired version can finish.
+    """
+
+    if path.is_dir() and not path.is_symlink():
+        # a directory written before versioning: moved aside once, which leaves path missing for a moment
+        previous_path = new_version_path(path)
+        path.rename(previous_path)
+    else:
+        previous_path = path.resolve() if path.exists() else None
+
+    link_path = path.with_name(f".{path.name}.{os.getpid()}.link")
+    link_path.unlink(missing_ok=True)
+    link_path.symlink_to(version_path.name)  # relative, so that the data directory can be moved
+    os.replace(link_path, path)
+
+    if previous_path is not None and previous_path != version_path.resolve():
+        (previous_path / _RETIRED_MARKER).touch()
+    _remove_retired_versions(path)
+
+
+def _remove_retired_versions(path: Path):
+    # versions being written are not marked yet
+    current_path = path.resolve()
+    for version_path in path.parent.glob(f".{path.name}.*"):
+        if not version_path.is_dir() or version_path.is_symlink() or version_path.resolve() == current_path:
+            continue
+        marker_path = version_path / _RETIRED_MARKER
+        try:
+            is_expired = marker_path.stat().st_mtime < time.time() - RETIRED_VERSION_SECONDS
+        except FileNotFoundError:
+            continue
+        if is_expired:
+            shutil.rmtree(version_path, ignore_errors=True)
+
+
+def df_source_path() -> Path:
+    """Path read by read_df: the current version of the partitioned dataset if it exists, otherwise the Parquet file.
+
+    Readers resolve it once, then read from it only, see publish_version.
+    """
+
+    return df_dataset_path.resolve() if df_dataset_path.exists() else df_parquet_path
+
+
+def df_source_mtime() -> float:
+    """Last modification time of the data read by read_df. write_dataset touches the dataset directory."""
+
+    return df_source_path().stat().st_mtime
+
+
+def _partition_cols(path: Path) -> list[str]:
+    """Partition columns of the dataset directory at path: store_id, optionally followed by section."""
+
+    if next(path.glob("store_id=*/section=*"), None) is not None:
+        return ["store_id", "section"]
+    return ["store_id"]
+
+
+def _partitioning(path: Path) -> Optional[ds.PartitioningFactory]:
+    """Hive partitioning of the dataset directory at path, None for a single file."""
+
+    if not path.is_dir():
+        return None
+
+    fields = [pa.field(col, pa.dictionary(pa.int32(), pa.string())) for col in _partition_cols(path)]
+    return ds.partitioning(pa.schema(fields), flavor="hive", dictionaries="infer")
+
+
+def _read_table(path: Path, filters: Optional[list[tuple]] = None, columns: Optional[list[str]] = None) -> pa.Table:
+    """Read the single Parquet file or the partitioned dataset at path, with columns (default: df_columns) in order."""
+
+    columns = columns or df_columns
+    table = pq.read_table(path, columns=columns, filters=filters or None, partitioning=_partitioning(path))
+    return table.select(columns)
+
+
+def _estimated_nbytes(path: Path) -> int:
+    """Size of df_columns of the data at path once read by _read_table, from the Parquet metadata only.
+
+    That is the number of rows times the width of a row: the dictionary-encoded columns taking the width of their
+    indices, and variable-width columns (if any) an estimated 16 bytes.
+    """
+
+    dataset = ds.dataset(path, format="parquet", partitioning=_partitioning(path))
+    row_nbytes = 0
+    for col in df_columns:
+        col_type = dataset.schema.field(col).type
+        col_type = col_type.index_type if pa.types.is_dictionary(col_type) else col_type
+        try:
+            row_nbytes += col_type.bit_width // 8
+        except ValueError:
+            row_nbytes += 16
+    return dataset.count_rows() * row_nbytes
+
+
+def _sort_by_series(table: pa.Table) -> pa.Table:
+    """Sort table by (store_id, section, indicator, start_time), keeping the order in which series first appear."""
+
+    keys = [pd.factorize(table[col].to_pandas().to_numpy())[0] for col in _series_cols]
+    return table.take(np.lexsort((table["start_time"].to_numpy(), *reversed(keys))))
+
+
+def write_ipc(path: Path = df_ipc_path):
+    """Write the data read by read_df from Parquet as an uncompressed Arrow IPC file, sorted as served by read_df.
+
+    Parquet remains the source: read_df rewrites the IPC file when it is older than the Parquet data.
+    """
+
+    table = _sort_by_series(_read_table(df_source_path()))
+    metadata = {**(table.schema.metadata or {}), _SORTED_METADATA_KEY: ",".join(df_columns)}
+    table = table.replace_schema_metadata(metadata)
+
+    # processes that mapped the previous file keep reading it until they notice the new mtime
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def write_dataset(
+    df: pd.DataFrame,
+    path: Path = df_dataset_path,
+    partition_by_section: bool = False,
+    row_group_size: int = DATASET_ROW_GROUP_SIZE,
+):
+    """Write df as a hive-partitioned dataset (store_id=<id>/[section=<section>/]part-0.parquet), replacing path.
+
+    Within a partition, rows are sorted by start_time, so that the row groups cover consecutive time ranges and their
+    statistics let start_time predicates skip data, while partition pruning makes the cost of reading a store
+    proportional to its size. The dataset is written as a new version of path, see publish_version.
+    """
+
+    version_path = _write_version(df, path, partition_by_section, row_group_size)
+    with file_lock(_lock_path(path)):
+        publish_version(path, version_path)
+
+
+def _write_version(
+    df: pd.DataFrame, path: Path, partition_by_section: bool = False, row_group_size: int = DATASET_ROW_GROUP_SIZE
+) -> Path:
+    """Write df as a new, unpublished version of the dataset at path (see write_dataset) and return its path."""
+
+    partition_cols = ["store_id", *(["section"] if partition_by_section else [])]
+    version_path = new_version_path(path)
+
+    for partition_key, part_df in df.groupby(partition_cols, observed=True, sort=False):
+        partition_path = version_path.joinpath(*(f"{col}={value}" for col, value in zip(partition_cols, partition_key)))
+        _write_fragment(part_df.drop(columns=partition_cols), partition_path, "part-0.parquet", row_group_size)
+
+    os.utime(version_path)  # see df_source_mtime
+    return version_path
+
+
+def _write_fragment(part_df: pd.DataFrame, partition_path: Path, name: str, row_group_size: int):
+    """Write the rows of a partition as an immutable fragment, sorted by start_time."""
+
+    partition_path.mkdir(parents=True, exist_ok=True)
+    # stable, so that series keep their order within a timestamp
+    table = pa.Table.from_pandas(part_df.sort_values("start_time", kind="stable"), preserve_index=False)
+    # hidden while being written: dataset discovery ignores names starting with "."
+    tmp_path = partition_path / f".{name}"
+    pq.write_table(table, tmp_path, row_group_size=row_group_size)
+    os.replace(tmp_path, partition_path / name)
+
+
+def _lock_path(path: Path) -> Path:
+    """Lock file serializing the writers of the dataset at path, across threads and processes."""
+
+    return path.with_name(f".{path.name}.lock")
+
+
+# called after append_df, e.g. to update derived data incrementally (see register_append_listener)
+_append_listeners: list[Callable[[], None]] = []
+
+
+def register_append_listener(listener: Callable[[], None]) -> Callable[[], None]:
+    """Call listener (without arguments) after each append_df, once the appended rows are readable."""
+
+    _append_listeners.append(listener)
+    return listener
+
+
+def append_df(df: pd.DataFrame, path: Path = df_dataset_path, max_fragments: int = DATASET_MAX_FRAGMENTS) -> int:
+    """Append a batch of new observations, with (at least) df_columns as columns, to the partitioned dataset.
+
+    Each partition of the batch is written as a new immutable fragment next to the existing ones, so nothing is
+    rewritten, except by the compaction of partitions holding more than max_fragments fragments (see
+    compact_partitions). The single Parquet file is converted to the partitioned layout on the first append.
+    Afterwards, the tree index is updated with the new series, then the append listeners run (e.g. `db.rollups`).
+    Appends are serialized across threads and processes. Returns the number of appended rows.
+    """
+
+    assert set(df_columns) <= set(df.columns), f"missing columns: {set(df_columns) - set(df.columns)}"
+    if df.empty:
+        return 0
+
+    df = df[df_columns].astype({
+        "store_id": str,
+        "start_time": "datetime64[ns]",
+        "section": "category",
+        "indicator": "category",
+        "value": "int64",
+        "promo": "int64",
+        "pollution": "float64",
+    })
+
+    _ensure_data()
+    with file_lock(_lock_path(path)):
+        if not path.exists():
+            publish_version(path, _write_version(read_df(), path))
+
+        version_path = path.resolve()
+        partition_cols = _partition_cols(version_path)
+        tree_mappings = get_tree_mappings()
+
+        name = f"part-{time.time_ns()}.parquet"
+        partition_names = []
+        for partition_key, part_df in df.groupby(partition_cols, observed=True, sort=False):
+            partition_key = partition_key if isinstance(partition_key, tuple) else (partition_key,)
+            partition_name = Path(*(f"{col}={value}" for col, value in zip(partition_cols, partition_key)))
+            part_df = part_df.drop(columns=partition_cols)
+            _write_fragment(part_df, version_path / partition_name, name, DATASET_ROW_GROUP_SIZE)
+            partition_names.append(partition_name)
+
+        full_partition_names = [
+            partition_name
+            for partition_name in partition_names
+            if len(list((version_path / partition_name).glob("*.parquet"))) > max_fragments
+        ]
+        if full_partition_names:
+            compact_partitions(path, full_partition_names)
+
+        os.utime(path.resolve())  # see df_source_mtime
+
+        # the new series are added to the tree of the previous version, instead of scanning the dataset
+        series_keys = [
+            (store_id, section, indicator)
+            for store_id, sections in tree_mappings.items()
+            for section, indicators in sections.items()
+            for indicator in indicators
+        ]
+        series_keys.extend(df[_series_cols].astype(str).drop_duplicates().itertuples(index=False, name=None))
+        with _tree_mappings_lock:
+            _store_tree_mappings(json.loads(json.dumps(get_tree_mappings_from_tuples(list(dict.fromkeys(series_keys))))))
+
+    for listener in _append_listeners:
+        listener()
+
+    return len(df)
+
+
+def compact_partitions(path: Path, partition_names: list[Path], row_group_size: int = DATASET_ROW_GROUP_SIZE):
+    """Merge the fragments of each partition of partition_names (relative to path) into one, sorted by start_time.
+
+    The compacted partitions are written to a new version of the dataset, which links the files of the other
+    partitions, and which is then published (see publish_version): readers see a partition either before or after its
+    compaction, never both, nor neither. The caller holds the lock of the dataset (see append_df).
+    """
+
+    current_path = path.resolve()
+    version_path = new_version_path(path)
+    for file_path in current_path.rglob("*.parquet"):
+        relative_path = file_path.relative_to(current_path)
+        if relative_path.parent not in partition_names and not relative_path.name.startswith("."):
+            (version_path / relative_path.parent).mkdir(parents=True, exist_ok=True)
+            # immutable fragments are shared between versions instead of being copied
+            os.link(file_path, version_path / relative_path)
+
+    for partition_name in partition_names:
+        fragments = sorted((current_path / partition_name).glob("*.parquet"))
+        part_df = pd.concat([pd.read_parquet(fragment) for fragment in fragments], ignore_index=True)
+        part_df = part_df.astype({col: "category" for col in ["section", "indicator"] if col in part_df})
+        _write_fragment(part_df, version_path / partition_name, f"part-{time.time_ns()}.parquet", row_group_size)
+
+    publish_version(path, version_path)
+
+
+class _DatasetCache:
+    """Process-wide, read-through copy of the dataset as an Arrow table.
+
+    Rows are sorted by (store_id, section, indicator, start_time), the stores/sections/indicators keeping the order in
+    which they first appear in the file. The rows of a store, or of a series, are then a contiguous range that is served
+    as a zero-copy slice of the table. The table is reloaded when the source or its mtime changes (see df_source_path),
+    and is not kept if it is larger than max_bytes.
+
+    With USE_IPC_STORE, the table is memory-mapped from df_ipc_path, whose pages are shared between processes and are
+    not counted against max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._version: Optional[tuple[Path, float]] = None
+        self._table: Optional[pa.Table] = None
+        # (store_id, section, indicator) -> (start, stop) of its rows, sorted by start_time
+        self._series_ranges: dict[tuple[str, str, str], tuple[int, int]] = {}
+        self._store_series: dict[str, list[tuple[str, str, str]]] = defaultdict(list)
+        self._start_times: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._ipc_lock = threading.Lock()
+
+    def get(self) -> Optional["_DatasetCache"]:
+        """Self, with the table of the current version of the file loaded, or None if it does not fit in memory."""
+
+        version = (df_source_path(), df_source_mtime())
+        if USE_IPC_STORE:
+            version = self._ipc_version(version[1])
+        with self._lock:
+            if version != self._version:
+                self._load(version)
+            return self if self._table is not None else None
+
+    def _ipc_version(self, source_mtime: float) -> tuple[Path, float]:
+        """Version of df_ipc_path, which is first rewritten if it is older than the data (see write_ipc).
+
+        The file is written outside of self._lock, by one thread, while the others keep being served the loaded table
+        (if any) instead of waiting for it.
+        """
+
+        if not df_ipc_path.exists() or df_ipc_path.stat().st_mtime < source_mtime:
+            if not self._ipc_lock.acquire(blocking=self._version is None):
+                return self._version
+            try:
+                # written by another thread while waiting for the lock
+                if not df_ipc_path.exists() or df_ipc_path.stat().st_mtime < source_mtime:
+                    write_ipc()
+            finally:
+                self._ipc_lock.release()
+        return df_ipc_path, df_ipc_path.stat().st_mtime
+
+    def _load(self, version: tuple[Path, float]):
+        # readers take a snapshot of these under self._lock (see read), so they are replaced, never updated in place
+        self._version = version
+        self._table = None
+        self._series_ranges = {}
+        self._store_series = defaultdict(list)
+        self._start_times = None
+
+        if version[0] == df_ipc_path:
+            table = feather.read_table(version[0], memory_map=True)
+        else:
+            # checked before reading anything but the metadata
+            if _estimated_nbytes(version[0]) > self.max_bytes:
+                return
+            table = _read_table(version[0])
+
+        if _SORTED_METADATA_KEY not in (table.schema.metadata or {}):
+            table = _sort_by_series(table)
+
+        series_ranges = {}
+        store_series = defaultdict(list)
+        keys_df = table.select(_series_cols).to_pandas()
+        for series_key, positions in keys_df.groupby(_series_cols, observed=True, sort=False).indices.items():
+            series_ranges[series_key] = (positions[0], positions[-1] + 1)
+            store_series[series_key[0]].append(series_key)
+        self._series_ranges = series_ranges
+        self._store_series = store_series
+        self._start_times = table["start_time"].to_numpy()
+        self._table = table
+
+    def read(
+        self,
+        store_id: Optional[str] = None,
+        section_indicator: Optional[tuple[str, str]] = None,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        columns: Optional[list[str]] = None,
+    ) -> pd.DataFrame:
+        """See read_df."""
+
+        # a consistent view, should another thread reload the table meanwhile
+        with self._lock:
+            table, series_ranges, store_series, start_times = (
+                self._table,
+                self._series_ranges,
+                self._store_series,
+                self._start_times,
+            )
+        if table is None:
+            # reloaded since get, and larger than max_bytes
+            return _read_parquet(store_id, section_indicator, start, end, columns)
+
+        table = table if columns is None else table.select(columns)
+        if not store_id and not section_indicator and start is None and end is None:
+            return table.to_pandas()
+
+        series_keys = store_series.get(store_id, []) if store_id else series_ranges
+        if section_indicator:
+            series_keys = [key for key in series_keys if key[1:] == tuple(section_indicator)]
+
+        slices = []
+        for series_key in series_keys:
+            range_start, range_stop = series_ranges[series_key]
+            series_start_times = start_times[range_start:range_stop]
+            if start is not None:
+                range_start += np.searchsorted(series_start_times, start.to_datetime64(), side="left")
+            if end is not None:
+                range_stop -= len(series_start_times) - np.searchsorted(
+                    series_start_times, end.to_datetime64(), side="left"
+                )
+            if range_stop > range_start:
+                slices.append(table.slice(range_start, range_stop - range_start))
+
+        return pa.concat_tables(slices).to_pandas() if slices else table.slice(0, 0).to_pandas()
+
+
+_dataset_cache = _DatasetCache(READ_CACHE_MAX_BYTES)
+
+
+def _ensure_data():
     # create df if it doesn't exist
-    if not df_parquet_path.exists():
+    if not df_source_path().exists():
         sys.path.insert(0, str(df_parquet_path.parent.parent))
         from data.data import get_data
 
         get_data(n_stores=10).to_parquet(df_parquet_path, index=False)
 
+
+def read_df(
+    store_id: Optional[str] = None,
+    section_indicator: Optional[tuple[str, str]] = None,
+    start: Optional[dt.date | dt.datetime] = None,
+    end: Optional[dt.date | dt.datetime] = None,
+    columns: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """Read the sales data, optionally only the rows of a store and/or section/indicator, and only some columns.
+
+    start is inclusive and end is exclusive, both compared to start_time. The bounds and the columns are pushed down
+    into the Parquet reader (or applied on the slices of the in-memory cache, or to the indexed query of
+    USE_SQLITE_STORE), so that only the requested window is decoded.
+    """
+
+    _ensure_data()
+
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    if USE_SQLITE_STORE:
+        # imported here, db.sqlite depending on this module
+        from db.sqlite import read_sqlite
+
+        return read_sqlite(store_id, section_indicator, start, end, columns)
+
+    dataset_cache = _dataset_cache.get()
+    if dataset_cache is not None:
+        return dataset_cache.read(store_id, section_indicator, start, end, columns)
+
+    return _read_parquet(store_id, section_indicator, start, end, columns)
+
+
+def _read_parquet(
+    store_id: Optional[str] = None,
+    section_indicator: Optional[tuple[str, str]] = None,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    columns: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """See read_df, reading the Parquet data with the filters pushed down, without the cache."""
+
     filters = []
     if store_id:
         filters.append(("store_id", "==", store_id))
     if section_indicator:
         filters.append(("section", "==", section_indicator[0]))
         filters.append(("indicator", "==", section_indicator[1]))
+    if start is not None:
+        filters.append(("start_time", ">=", start))
+    if end is not None:
+        filters.append(("start_time", "<", end))
 
-    if filters:
-        df = pd.read_parquet(df_parquet_path, filters=filters)
-    else:
-        df = pd.read_parquet(df_parquet_path)
-
-    return df
+    return _read_table(df_source_path(), filters, columns).to_pandas()
 
 
 def get_tree_mappings_from_tuples(lst: list[tuple]):
@@ -59,32 +562,74 @@ def get_tree_mappings_from_tuples(lst: list[tuple]):
     return d
 
 
-# stores to sections to indicators
-def _get_tree_mappings(df: Optional[pd.DataFrame] = None, store_id: Optional[str] = None) -> dict[str, dict[str, str]]:
-    """Get a mapping from stores to sections to indicators.
+def _scan_tree_mappings(path: Path) -> dict[str, dict[str, list[str]]]:
+    """Tree of the distinct (store_id, section, indicator) of the data at path, in order of first appearance.
 
-    E.g., {'001': {'BEVERAGE': ['Items', 'Sales', 'Transactions']}}
+    Only the three category columns are scanned, batch by batch, so memory does not grow with the number of rows. With
+    the partitioned layout, store_id (and section) come from the partition directories.
     """
 
-    if df is None != store_id is None:
-        raise ValueError("df and store_id must be both supplied or both omitted.")
+    dataset = ds.dataset(path, format="parquet", partitioning=_partitioning(path))
+    series_keys = {}
+    for batch in dataset.to_batches(columns=_series_cols):
+        batch_keys = batch.to_pandas().drop_duplicates()
+        series_keys.update(dict.fromkeys(batch_keys.astype(str).itertuples(index=False, name=None)))
 
-    if df is None:
-        df = read_df()
-    else:
-        df["store_id"] = store_id
-
-    tree_mappings = (
-        df.loc[:, ["store_id", "section", "indicator"]]
-        .groupby(["store_id"], observed=True)
-        .apply(
-            lambda df: df.groupby(["section"], observed=True, sort=False).apply(lambda df: df.indicator.unique().tolist()).to_dict()
-        )
-        .to_dict()
-    )
+    return json.loads(json.dumps(get_tree_mappings_from_tuples(list(series_keys))))
+
+
+_tree_mappings: dict[tuple[str, float], dict[str, dict[str, list[str]]]] = {}
+_tree_mappings_lock = threading.Lock()
+
+
+def get_tree_mappings() -> dict[str, dict[str, list[str]]]:
+    """Get a mapping from stores to sections to indicators, e.g. {'001': {'MAINS': ['Transactions', 'Items']}}.
+
+    The tree is kept in memory and in the tree_index_path sidecar file, along with the source and mtime of the data it
+    was computed from (see df_source_path). It is recomputed by `_scan_tree_mappings` when the data changes.
+    """
+
+    _ensure_data()
+    version = (str(df_source_path()), df_source_mtime())
+    with _tree_mappings_lock:
+        if version in _tree_mappings:
+            return _tree_mappings[version]
+
+        try:
+            index = json.loads(tree_index_path.read_text())
+        except (FileNotFoundError, ValueError):
+            index = {}
+        if (index.get("source"), index.get("mtime")) == version:
+            tree_mappings = index["tree"]
+            _tree_mappings.clear()
+            _tree_mappings[version] = tree_mappings
+        else:
+            tree_mappings = _store_tree_mappings(_scan_tree_mappings(df_source_path()), version)
+        return tree_mappings
+
+
+def _store_tree_mappings(
+    tree_mappings: dict[str, dict[str, list[str]]], version: Optional[tuple[str, float]] = None
+) -> dict[str, dict[str, list[str]]]:
+    """Keep tree_mappings as the tree of version (default: the current data), in memory and in the sidecar file."""
+
+    version = version or (str(df_source_path()), df_source_mtime())
+    tmp_path = tree_index_path.with_name(f".{tree_index_path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({"source": version[0], "mtime": version[1], "tree": tree_mappings}))
+    os.replace(tmp_path, tree_index_path)
+
+    _tree_mappings.clear()
+    _tree_mappings[version] = tree_mappings
     return tree_mappings
 
 
-@cache
-def get_tree_mappings() -> dict[str, dict[str, str]]:
-    return _get_tree_mappings()
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the sales data to the hive-partitioned layout of read_df.")
+    parser.add_argument("--partition-by-section", action="store_true", help="partition by section within stores")
+    parser.add_argument("--row-group-size", type=int, default=DATASET_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    write_dataset(read_df(), partition_by_section=args.partition_by_section, row_group_size=args.row_group_size)
+    print(f"written to {df_dataset_path}")
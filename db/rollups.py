@@ -0,0 +1,161 @@
+"""Materialized day/week/month sums of the sales data per store/section/indicator, for the Data Explorer.
+
+The 30-minute grain is the dataset itself (see `db.crud.read_df`). Coarser grains are aggregated once into one small
+Parquet file per frequency, built on first use (or offline with `python -m db.rollups`) and rebuilt when the dataset
+is rewritten. `update_rollups` aggregates appended data only.
+"""
+
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+from db.crud import (
+    df_parquet_path,
+    df_source_mtime,
+    get_tree_mappings,
+    new_version_path,
+    publish_version,
+    read_df,
+    register_append_listener,
+)
+from utils.utils import TIME_STEP, file_lock
+
+rollups_path = df_parquet_path.parent / "demo_sales_rollups"
+
+FREQ_DAY = "day"
+FREQ_WEEK = "week"
+FREQ_MONTH = "month"
+
+# frequency -> start of the bucket of each start_time (weeks begin Monday, like the forecast weeks)
+_bucket_starts: dict[str, Callable[[pd.Series], pd.Series]] = {
+    FREQ_DAY: lambda start_time: start_time.dt.floor("D"),
+    FREQ_WEEK: lambda start_time: start_time.dt.to_period("W-SUN").dt.start_time,
+    FREQ_MONTH: lambda start_time: start_time.dt.to_period("M").dt.start_time,
+}
+
+rollup_cols = ["store_id", "section", "indicator", "start_time", "value"]
+
+
+def _bucket_start(timestamp: pd.Timestamp, freq: str) -> pd.Timestamp:
+    return _bucket_starts[freq](pd.Series([timestamp])).iloc[0]
+
+
+def _aggregate(df: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """Sum of value per store/section/indicator and bucket of freq, with rollup_cols as columns."""
+
+    df = df.assign(start_time=_bucket_starts[freq](df["start_time"]))
+    rollup_df = df.groupby(by=["store_id", "section", "indicator", "start_time"], observed=True).value.sum()
+    return rollup_df.reset_index()[rollup_cols]
+
+
+def _write_rollup(rollup_df: pd.DataFrame, path: Path, freq: str):
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_path = path / f".{freq}.parquet.tmp"
+    rollup_df.sort_values(["store_id", "section", "indicator", "start_time"]).to_parquet(tmp_path, index=False)
+    tmp_path.rename(path / f"{freq}.parquet")
+
+
+def _lock_path(path: Path) -> Path:
+    """Lock file serializing the writers of the rollups at path, across threads and processes."""
+
+    return path.with_name(f".{path.name}.lock")
+
+
+def build_rollups(path: Path = rollups_path):
+    """(Re)build the rollups of every frequency from the full dataset, as a new version (see db.crud.publish_version)."""
+
+    with file_lock(_lock_path(path)):
+        _build(path)
+
+
+def _build(path: Path):
+    df = read_df(columns=rollup_cols)
+    version_path = new_version_path(path)
+    for freq in _bucket_starts:
+        _write_rollup(_aggregate(df, freq), version_path, freq)
+    publish_version(path, version_path)
+
+
+def update_rollups(path: Path = rollups_path) -> int:
+    """Aggregate the rows of the dataset from the latest materialized bucket of each store onwards.
+
+    The latest bucket may have been partial, so it is recomputed along with the new ones. Only the rows from the
+    earliest of these buckets are read. Returns the number of recomputed buckets.
+    """
+
+    if not path.exists():
+        build_rollups(path)
+        return 0
+
+    n_buckets = 0
+    with file_lock(_lock_path(path)):
+        for freq in _bucket_starts:
+            rollup_df = pd.read_parquet(path / f"{freq}.parquet")
+            latest = rollup_df.groupby("store_id", observed=True).start_time.max().rename("latest")
+
+            has_new_stores = not set(get_tree_mappings()) <= set(latest.index)
+            df = read_df(start=None if has_new_stores else latest.min(), columns=rollup_cols)
+            df = df.join(latest, on="store_id")
+            # stores without rollups yet (latest is NaT) are aggregated in full
+            df = df[~(df["start_time"] < df["latest"])].drop(columns="latest")
+            new_df = _aggregate(df, freq)
+
+            rollup_df = rollup_df.join(latest, on="store_id")
+            rollup_df = rollup_df[rollup_df["start_time"] < rollup_df["latest"]].drop(columns="latest")
+            _write_rollup(pd.concat([rollup_df, new_df], ignore_index=True), path, freq)
+            n_buckets += len(new_df)
+
+    return n_buckets
+
+
+def _is_stale(path: Path) -> bool:
+    """Whether the dataset was rewritten after the rollups were written."""
+
+    files = list(path.glob("*.parquet"))
+    if len(files) < len(_bucket_starts):
+        return True
+    return df_source_mtime() > min(file.stat().st_mtime for file in files)
+
+
+def read_rollup(
+    store_id: str, freq: str, end: Optional[pd.Timestamp] = None, path: Path = rollups_path
+) -> pd.DataFrame:
+    """Sums of value of store_id per section/indicator and bucket of freq, of the rows before end (exclusive).
+
+    If end falls inside a bucket, that bucket is aggregated from the rows between its start and end.
+    """
+
+    assert freq in _bucket_starts, f"invalid frequency: {freq}"
+
+    if not path.exists() or _is_stale(path):
+        with file_lock(_lock_path(path)):
+            # built by another thread or process while waiting for the lock
+            if not path.exists() or _is_stale(path):
+                _build(path)
+
+    filters = [("store_id", "==", store_id)]
+    if end is None:
+        return pd.read_parquet(path / f"{freq}.parquet", filters=filters)
+
+    end = pd.Timestamp(end)
+    partial_start = _bucket_start(end - TIME_STEP, freq)
+    if _bucket_start(end, freq) == end:
+        # end is the boundary of a bucket, which are all complete
+        return pd.read_parquet(path / f"{freq}.parquet", filters=[*filters, ("start_time", "<", end)])
+
+    rollup_df = pd.read_parquet(path / f"{freq}.parquet", filters=[*filters, ("start_time", "<", partial_start)])
+    partial_df = _aggregate(read_df(store_id, start=partial_start, end=end, columns=rollup_cols), freq)
+    return pd.concat([rollup_df, partial_df], ignore_index=True)
+
+
+@register_append_listener
+def _update_after_append():
+    # rollups that were never built are built on first use instead
+    if rollups_path.exists():
+        update_rollups()
+
+
+if __name__ == "__main__":
+    build_rollups()
+    print(f"written to {rollups_path}")
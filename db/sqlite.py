@@ -0,0 +1,353 @@
+"""SQLite copy of the sales data, served by read_df with `db.crud.USE_SQLITE_STORE`.
+
+Each row of the table holds a chunk of a series: its rows in a week (from Monday), as one BLOB of the raw numpy values
+per column. The primary key (store_id, section, indicator, week_start) makes the table itself the composite index: a
+store, a series or a time range of either is a range scan of the B-tree, which returns a few hundred rows for a
+store's history instead of one row per observation, whose BLOBs numpy reads as arrays without parsing. The rows of the
+first and last weeks outside of the requested range are then dropped. The database is opened read-only, so any
+number of threads and processes (e.g. GUI sessions) read it concurrently, sharing the memory-mapped pages.
+
+Parquet remains the source: the database is bulk-loaded from it, and rebuilt when it is older than the Parquet data.
+Appended rows are written incrementally instead, see `update_sqlite`.
+
+Usage (from the repository root):
+
+    python -m db.sqlite              # (re)build data/demo_sales_data.sqlite
+    python -m db.sqlite --benchmark  # compare the read_df queries of the app against the Parquet paths
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Engine,
+    LargeBinary,
+    MetaData,
+    PrimaryKeyConstraint,
+    String,
+    Table,
+    create_engine,
+    event,
+    func,
+    select,
+)
+
+from db.crud import (
+    _dataset_cache,
+    _ensure_data,
+    _read_parquet,
+    _read_table,
+    df_columns,
+    df_parquet_path,
+    df_source_mtime,
+    df_source_path,
+    get_tree_mappings,
+    register_append_listener,
+)
+from utils.utils import file_lock
+
+sqlite_path = df_parquet_path.with_suffix(".sqlite")
+
+# bytes of the database memory-mapped by each connection, pages being shared between connections and processes
+SQLITE_MMAP_SIZE = 1 * 2**30
+
+# layout of the database, databases of another version being rebuilt
+SQLITE_SCHEMA_VERSION = 2
+
+metadata = MetaData()
+
+# numpy dtypes of the columns of a chunk, little-endian whatever the machine, start_time being stored as nanoseconds
+# since the epoch (datetime64[ns])
+chunk_dtypes = {"start_time": "<i8", "value": "<i8", "promo": "<i8", "pollution": "<f8"}
+key_columns = ["store_id", "section", "indicator"]
+
+# week_start is the Monday (at midnight, in nanoseconds since the epoch) of the rows of the chunk
+sales_table = Table(
+    "sales_chunks",
+    metadata,
+    Column("store_id", String, nullable=False),
+    Column("section", String, nullable=False),
+    Column("indicator", String, nullable=False),
+    Column("week_start", BigInteger, nullable=False),
+    *(Column(col, LargeBinary, nullable=False) for col in chunk_dtypes),
+    PrimaryKeyConstraint("store_id", "section", "indicator", "week_start", name="sales_series_week"),
+    sqlite_with_rowid=False,
+)
+
+_WEEK_NS = pd.Timedelta(weeks=1).value
+# 1970-01-05, the first Monday since the epoch
+_MONDAY_NS = pd.Timedelta(days=4).value
+
+_engine: Optional[Engine] = None
+_engine_version: Optional[float] = None
+_lock = threading.Lock()
+
+
+def _week_start(start_time: np.ndarray) -> np.ndarray:
+    """Monday of the week of each of start_time (nanoseconds since the epoch)."""
+
+    return (start_time - _MONDAY_NS) // _WEEK_NS * _WEEK_NS + _MONDAY_NS
+
+
+def _chunks(store_df: pd.DataFrame) -> list[tuple]:
+    """Rows of sales_table holding the rows of store_df (a single store, with df_columns as columns)."""
+
+    store_df = store_df.astype({"store_id": str, "section": str, "indicator": str, "start_time": "int64"})
+    store_df["week_start"] = _week_start(store_df["start_time"].to_numpy())
+    store_df = store_df.sort_values([*key_columns, "start_time"])
+
+    chunks = []
+    for (store_id, section, indicator, week_start), chunk_df in store_df.groupby(
+        [*key_columns, "week_start"], sort=False
+    ):
+        # week_start as an int, which sqlite3 would otherwise bind as a BLOB
+        blobs = (chunk_df[col].to_numpy().astype(dtype).tobytes() for col, dtype in chunk_dtypes.items())
+        chunks.append((store_id, section, indicator, int(week_start), *blobs))
+    return chunks
+
+
+def _sqlite_lock_path(path: Path) -> Path:
+    """Lock file serializing the writers of the database at path, across threads and processes."""
+
+    return path.with_name(f".{path.name}.lock")
+
+
+def build_sqlite(path: Path = sqlite_path):
+    """(Re)build the database at path from the Parquet data, one store at a time.
+
+    The chunks of a store are inserted in primary key order, so the B-tree is filled by appending, and memory does not
+    grow with the number of stores. The database is written next to path, then moved over it. The caller holds the
+    lock of the database (see _sqlite_lock_path).
+    """
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    engine = create_engine(f"sqlite:///{tmp_path}")
+    with engine.begin() as conn:
+        # a crash only loses the temporary file
+        conn.exec_driver_sql("PRAGMA journal_mode = OFF")
+        conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        conn.exec_driver_sql(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+        metadata.create_all(conn)
+
+        source_path = df_source_path()
+        for store_id in get_tree_mappings():
+            store_df = _read_table(source_path, [("store_id", "==", store_id)]).to_pandas()
+            conn.exec_driver_sql(str(sales_table.insert().compile(dialect=engine.dialect)), _chunks(store_df))
+    engine.dispose()
+
+    os.replace(tmp_path, path)
+
+
+def update_sqlite(path: Path = sqlite_path) -> int:
+    """Write the rows of the dataset from the latest chunk of each store onwards into the database at path.
+
+    The latest chunk may have been partial, so it is rewritten along with the new ones, and stores without chunks yet
+    are written in full. Only the rows from the earliest of these chunks are read. Returns the number of written
+    chunks.
+    """
+
+    with file_lock(_sqlite_lock_path(path)):
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as conn:
+            query = select(sales_table.c.store_id, func.max(sales_table.c.week_start)).group_by(sales_table.c.store_id)
+            latest = pd.Series(dict(conn.execute(query).all()), dtype="int64").rename("latest")
+
+            has_new_stores = not set(get_tree_mappings()) <= set(latest.index)
+            # from the Parquet data, which read_df may be reading through this database
+            df = _read_parquet(start=None if has_new_stores else pd.Timestamp(latest.min()))
+            df = df.astype({"store_id": str}).join(latest, on="store_id")
+            # stores without chunks yet (latest is NaN) are written in full
+            df = df[~(df["start_time"].astype("int64") < df["latest"])].drop(columns="latest")
+
+            chunks = [chunk for _, store_df in df.groupby("store_id", sort=False) for chunk in _chunks(store_df)]
+            if chunks:
+                insert = sales_table.insert().prefix_with("OR REPLACE")
+                conn.exec_driver_sql(str(insert.compile(dialect=engine.dialect)), chunks)
+        engine.dispose()
+    return len(chunks)
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def _schema_version(path: Path) -> int:
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _get_engine(path: Path = sqlite_path) -> Engine:
+    """Read-only engine of the database at path, (re)built first if it is missing or older than the Parquet data."""
+
+    global _engine, _engine_version
+
+    with _lock:
+        if not path.exists() or path.stat().st_mtime < df_source_mtime():
+            with file_lock(_sqlite_lock_path(path)):
+                # (re)built by another process while waiting for the lock
+                if not path.exists() or path.stat().st_mtime < df_source_mtime():
+                    build_sqlite(path)
+
+        # a rebuilt database is a new file: connections to the previous one are closed once returned to the pool
+        version = path.stat().st_mtime
+        if version != _engine_version:
+            if _schema_version(path) != SQLITE_SCHEMA_VERSION:
+                with file_lock(_sqlite_lock_path(path)):
+                    build_sqlite(path)
+                version = path.stat().st_mtime
+            if _engine is not None:
+                _engine.dispose()
+            _engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+            event.listen(_engine, "connect", _set_pragmas)
+            _engine_version = version
+        return _engine
+
+
+def read_sqlite(
+    store_id: Optional[str] = None,
+    section_indicator: Optional[tuple[str, str]] = None,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    columns: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """See read_df. Rows are ordered by store_id, section, indicator and start_time."""
+
+    _ensure_data()
+    columns = columns or df_columns
+    start = pd.Timestamp(start).value if start is not None else None
+    end = pd.Timestamp(end).value if end is not None else None
+
+    # start_time is needed to trim the chunks of the first and last weeks
+    chunk_columns = [col for col in chunk_dtypes if col in columns or col == "start_time"]
+    query = select(*(sales_table.c[col] for col in [*key_columns, *chunk_columns]))
+    if store_id:
+        query = query.where(sales_table.c.store_id == store_id)
+    if section_indicator:
+        query = query.where(
+            sales_table.c.section == section_indicator[0], sales_table.c.indicator == section_indicator[1]
+        )
+    if start is not None:
+        query = query.where(sales_table.c.week_start >= int(_week_start(np.int64(start))))
+    if end is not None:
+        query = query.where(sales_table.c.week_start < end)
+    # the order of the primary key, so that SQLite does not sort
+    query = query.order_by(*sales_table.primary_key.columns)
+
+    engine = _get_engine()
+    compiled = query.compile(dialect=engine.dialect)
+    with engine.connect() as conn:
+        # chunks are fetched by the sqlite3 cursor itself, without the result processing of SQLAlchemy
+        cursor = conn.connection.driver_connection.execute(
+            str(compiled), [compiled.params[name] for name in compiled.positiontup]
+        )
+        chunks = cursor.fetchall()
+
+    values, n_rows = {}, None
+    for n, col in enumerate(chunk_columns, start=len(key_columns)):
+        arrays = [np.frombuffer(chunk[n], dtype=chunk_dtypes[col]) for chunk in chunks]
+        values[col] = np.concatenate(arrays) if arrays else np.empty(0, dtype=chunk_dtypes[col])
+        # in the byte order of the machine
+        values[col] = values[col].astype(np.dtype(chunk_dtypes[col]).newbyteorder("="), copy=False)
+        if n_rows is None:
+            n_rows = np.array([len(array) for array in arrays], dtype=np.int64)
+
+    mask = np.ones(len(values["start_time"]), dtype=bool)
+    if start is not None:
+        mask &= values["start_time"] >= start
+    if end is not None:
+        mask &= values["start_time"] < end
+
+    data = {}
+    for n, col in enumerate(key_columns):
+        if col in columns:
+            # one code per chunk, repeated for its rows
+            codes, categories = pd.factorize(np.array([chunk[n] for chunk in chunks], dtype=object), sort=True)
+            data[col] = pd.Categorical.from_codes(np.repeat(codes, n_rows)[mask], categories=categories)
+    for col, array in values.items():
+        if col in columns:
+            data[col] = array[mask].astype("datetime64[ns]") if col == "start_time" else array[mask]
+
+    return pd.DataFrame({col: data[col] for col in columns})
+
+
+def _benchmark(n_repeats: int, n_threads: int):
+    """Time the queries of the app through SQLite, the Parquet reader and the in-memory cache of read_df."""
+
+    store_id = next(iter(get_tree_mappings()))
+    section, indicators = next(iter(get_tree_mappings()[store_id].items()))
+    cutoff = pd.Timestamp("2024-01-01")
+    week = (cutoff, cutoff + pd.Timedelta(weeks=1))
+
+    queries = {
+        "point (series, 1 day)": dict(
+            store_id=store_id, section_indicator=(section, indicators[0]), start=cutoff, end=cutoff + pd.Timedelta(days=1)
+        ),
+        "range (store, 1 week)": dict(store_id=store_id, start=week[0], end=week[1]),
+        "history (store, to cutoff)": dict(store_id=store_id, end=cutoff),
+        "full scan": dict(),
+    }
+    backends = {
+        "sqlite": read_sqlite,
+        "parquet": _read_parquet,
+        "cache": lambda **kwargs: _dataset_cache.get().read(**kwargs),
+    }
+
+    # warm up: build the database, load the cache
+    for read in backends.values():
+        read(**queries["range (store, 1 week)"])
+
+    print(f"{'query':<28}{'rows':>8}" + "".join(f"{backend + ' (ms)':>16}" for backend in backends))
+    for name, kwargs in queries.items():
+        timings = []
+        for read in backends.values():
+            start = time.perf_counter()
+            for _ in range(n_repeats):
+                n_rows = len(read(**kwargs))
+            timings.append((time.perf_counter() - start) / n_repeats * 1000)
+        print(f"{name:<28}{n_rows:>8}" + "".join(f"{timing:>16.1f}" for timing in timings))
+
+    # concurrent sessions reading the history of the store, as on scenario creation
+    print(f"\n{n_threads} threads x {n_repeats} history reads (ms, wall)")
+    for backend, read in backends.items():
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            for _ in executor.map(lambda _: read(**queries["history (store, to cutoff)"]), range(n_threads * n_repeats)):
+                pass
+        print(f"{backend:<28}{(time.perf_counter() - start) * 1000:>8.1f}")
+
+
+@register_append_listener
+def _update_after_append():
+    # a database that was never built is built on first use instead
+    if sqlite_path.exists() and _schema_version(sqlite_path) == SQLITE_SCHEMA_VERSION:
+        update_sqlite()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--benchmark", action="store_true", help="time read_df queries against the Parquet paths")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.repeats, args.threads)
+    else:
+        _ensure_data()
+        build_sqlite()
+        print(f"written to {sqlite_path}")
@@ -1,8 +1,15 @@
 from typing import Optional
+from db.crud import df_source_mtime
 from db.schema import ForecastStoreRequest
+from tpconfig.tpconfig import sales_forecast_scenario_cfg
 import pandas as pd
 import taipy as tp
+import dataclasses
 import datetime as dt
+import functools
+import hashlib
+import json
+from pathlib import Path
 
 def fsr_to_label(fsr: ForecastStoreRequest) -> str:
     """Used as an adapter for the scenario selector lov.
@@ -41,4 +48,84 @@ def get_ordered_scenarios():
 
     scenario_list = tp.get_scenarios()
     scenario_list.sort(key=lambda s: s.creation_date, reverse=True)
-    return scenario_list
\ No newline at end of file
+    return scenario_list
+
+
+# code computing the outputs of a scenario, including the configuration of the models and the reading of the data (see
+# scenario_input_key): every module of these packages, so that a module added or imported later is covered as well
+_scenario_code_paths = sorted(
+    path
+    for package in ["algo", "db", "tpconfig", "utils"]
+    for path in (Path(__file__).parent.parent / package).rglob("*.py")
+)
+_INPUT_KEY_PROPERTY = "input_key"
+
+
+@functools.cache
+def _code_version() -> str:
+    digest = hashlib.sha256()
+    for path in _scenario_code_paths:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def scenario_input_key(
+    fsr: ForecastStoreRequest, cutoff_date: dt.date, promo_flag: bool, air_pollution: int
+) -> str:
+    """Content address of the outputs of a scenario.
+
+    Hash of the inputs of the scenario, of the code of the models (and their configuration) and of the version of the
+    data, so that scenarios with the same key have the same outputs.
+    """
+
+    inputs = {
+        "forecast_store_request": dataclasses.asdict(fsr),
+        "cutoff_date": cutoff_date,
+        "promo_flag": bool(promo_flag),
+        "air_pollution": int(air_pollution),
+        "code_version": _code_version(),
+        "data_version": df_source_mtime(),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _find_scenario(input_key: str) -> Optional[tp.Scenario]:
+    """The latest scenario of input_key whose outputs are computed from its current inputs, if any."""
+
+    for scenario in get_ordered_scenarios():
+        if scenario.properties.get(_INPUT_KEY_PROPERTY) != input_key:
+            continue
+        # the inputs may have been edited since the key was stored
+        current_key = scenario_input_key(
+            scenario.forecast_store_request.read(),
+            scenario.cutoff_date.read(),
+            scenario.promo_flag.read(),
+            scenario.air_pollution.read(),
+        )
+        if current_key == input_key and scenario.data_df.is_ready_for_reading and scenario.data_df.is_up_to_date:
+            return scenario
+    return None
+
+
+def get_or_create_scenario(
+    fsr: ForecastStoreRequest, cutoff_date: dt.date, promo_flag: bool, air_pollution: int
+) -> tuple[tp.Scenario, bool]:
+    """Get the scenario with the same outputs as these inputs (see scenario_input_key), or create one to submit.
+
+    Returns the scenario and whether it was created. Identical submissions then reuse the outputs of the first one,
+    instead of running the models again and storing another copy of them.
+    """
+
+    input_key = scenario_input_key(fsr, cutoff_date, promo_flag, air_pollution)
+    scenario = _find_scenario(input_key)
+    if scenario is not None:
+        return scenario, False
+
+    scenario = tp.create_scenario(sales_forecast_scenario_cfg, name=fsr_to_label(fsr))
+    scenario.name += f" | id={scenario.id[-4:]}"
+    scenario.forecast_store_request.write(fsr)
+    scenario.cutoff_date.write(cutoff_date)
+    scenario.promo_flag.write(promo_flag)
+    scenario.air_pollution.write(air_pollution)
+    scenario.properties[_INPUT_KEY_PROPERTY] = input_key
+    return scenario, True
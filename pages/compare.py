@@ -5,7 +5,8 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
 from pages.common import create_scenario_summary_df, year_week_adapter
-from tpconfig.tpconfig import FCST_SMA_KEY, FCST_XGB_KEY
+from algo.registry import forecasters
+from tpconfig.tpconfig import FCST_XGB_KEY, FORECASTER_KEYS
 from sklearn.metrics import mean_squared_error
 
 
@@ -23,6 +24,9 @@ show_similar_scenarios_only = True
 
 show_compared_advanced_select = False
 
+# the model whose forecasts are compared between scenarios
+COMPARED_FCST_KEY = FCST_XGB_KEY if FCST_XGB_KEY in FORECASTER_KEYS else FORECASTER_KEYS[-1]
+
 fig = None
 xgb_mse_scenario_a = 0
 xgb_mse_scenario_b = 0
@@ -90,14 +94,14 @@ Compare **Scenario A**{: style="color: $scenario_a_color;"} (selected in the top
 <kpi|layout|columns=1 1|
 
 <|card p-half m-half text-center card-font card-bg|
-**XGB MSE**{: .color-primary} <br/>
+**$compared_label MSE**{: .color-primary} <br/>
 **[Scenario A]**{: style="color: $scenario_a_color;"}
 
 <|{xgb_mse_scenario_a}|text|raw|format=%,.2f|>
 |>
 
 <|card p-half m-half text-center card-font card-bg|
-**XGB MSE**{: .color-primary} <br/>
+**$compared_label MSE**{: .color-primary} <br/>
 **[Scenario B]**{: style="color: $scenario_b_color;"}
 
 <|{xgb_mse_scenario_b}|text|raw|format=%,.2f|>
@@ -155,7 +159,11 @@ def compared_advanced_select_table_action(state, var_name, payload):
 scenario_a_color = px.colors.qualitative.D3[0]
 scenario_b_color = px.colors.qualitative.D3[3]
 
-compare_md = Markdown(compare_template.substitute(scenario_a_color=scenario_a_color, scenario_b_color=scenario_b_color))
+compare_md = Markdown(compare_template.substitute(
+    scenario_a_color=scenario_a_color,
+    scenario_b_color=scenario_b_color,
+    compared_label=forecasters[COMPARED_FCST_KEY].label,
+))
 
 def create_scenario_comparison_line_chart(state):
     selected_section = state.selected_section
@@ -169,7 +177,7 @@ def create_scenario_comparison_line_chart(state):
     df1 = data_df1[(data_df1.section == selected_section) & (data_df1.indicator == selected_indicator)].copy()
     df2 = data_df2[(data_df2.section == selected_section) & (data_df2.indicator == selected_indicator)].copy()
 
-    y_vars = ["value", FCST_XGB_KEY]
+    y_vars = ["value", COMPARED_FCST_KEY]
     main_fig = px.line(df1, x="start_time", y=y_vars, title="Forecast over Time")
     main_fig.update_traces(line_color=scenario_a_color)
     main_fig.for_each_trace(lambda t: t.update(name=t.name+"_ScenarioA", legendgroup=t.legendgroup+"_ScenarioA"))
@@ -178,8 +186,8 @@ def create_scenario_comparison_line_chart(state):
     sub_fig.for_each_trace(lambda t: t.update(name=t.name+"_ScenarioB", legendgroup=t.legendgroup+"_ScenarioB"))
     main_fig.add_traces(sub_fig.data)
 
-    main_fig.for_each_trace(lambda t: t.update(line_dash="dot"), selector=lambda t: t.name.startswith(FCST_XGB_KEY))
-    main_fig.for_each_trace(lambda t: t.update(visible="legendonly"), selector=lambda t: not t.name.startswith(FCST_XGB_KEY))
+    main_fig.for_each_trace(lambda t: t.update(line_dash="dot"), selector=lambda t: t.name.startswith(COMPARED_FCST_KEY))
+    main_fig.for_each_trace(lambda t: t.update(visible="legendonly"), selector=lambda t: not t.name.startswith(COMPARED_FCST_KEY))
     main_fig.update_layout(xaxis1=dict(title_text="start_time"), yaxis=dict(title_text="value"))
 
     # Add x-axis2
@@ -253,8 +261,8 @@ def compare_on_change(state, var_name, var_value):
             _df_a = _df_a[(_df_a.section == state.selected_section) & (_df_a.indicator == state.selected_indicator)]
             _df_b = state.compared_scenario.data_df.read()
             _df_b = _df_b[(_df_b.section == state.selected_section) & (_df_b.indicator == state.selected_indicator)]
-            state.xgb_mse_scenario_a = mean_squared_error(_df_a.value, _df_a[FCST_XGB_KEY])
-            state.xgb_mse_scenario_b = mean_squared_error(_df_b.value, _df_b[FCST_XGB_KEY])
+            state.xgb_mse_scenario_a = mean_squared_error(_df_a.value, _df_a[COMPARED_FCST_KEY])
+            state.xgb_mse_scenario_b = mean_squared_error(_df_b.value, _df_b[COMPARED_FCST_KEY])
         else: 
             state.xgb_mse_scenario_a = 0
             state.xgb_mse_scenario_b = 0
\ No newline at end of file
@@ -1,17 +1,23 @@
 from taipy.gui import Markdown, notify, Icon
 import taipy as tp
 from string import Template
-from tpconfig.tpconfig import sales_forecast_scenario_cfg, forecast_dates
+from typing import Optional
+import pandas as pd
+from algo.prefetch import prefetch_store
+from algo.registry import forecasters
+from tpconfig.tpconfig import forecast_dates, FORECASTER_KEYS, WHAT_IF_CUBE
 from db.crud import get_tree_mappings
 from db.schema import ForecastStoreRequest
-from pages.common import fsr_to_label, year_week_date_adapter, create_scenario_summary_df, get_ordered_scenarios
+from pages.common import (
+    year_week_date_adapter, create_scenario_summary_df, get_or_create_scenario, get_ordered_scenarios
+)
 import datetime as dt
+import functools
 
 year_week_date_adapter
 create_scenario_summary_df
 
-tree_mappings = get_tree_mappings()
-store_list = list(tree_mappings.keys())
+store_list = list(get_tree_mappings().keys())
 selected_store = store_list[0]
 
 forecast_dates
@@ -73,7 +79,7 @@ Scenarios with the same Store ID as the selected store.
 **Selected store:** <|{selected_store}|>
 
 <|{create_similar_scenarios_df(selected_store, scenario_list)}|table|width=fit-content|filter|allow_all_rows|date_format=yyyy-MM-dd HH:mm:SS|>
-
+$what_if_preview
 |rhs>
 
 <|layout.end|>
@@ -83,7 +89,76 @@ def create_similar_scenarios_df(selected_store: str, scenario_list: list[tp.Scen
     similar_scenario_lst = [s for s in scenario_list if s.forecast_store_request.read().store_id == selected_store]
     return create_scenario_summary_df(similar_scenario_lst)
 
-create_md = Markdown(create_template.substitute())
+# only scenarios forecasting the what-if cube can be previewed (see tpconfig.WHAT_IF_CUBE)
+what_if_preview = """
+## What-if preview
+
+Total sales forecast of the latest scenario with the selected store and week, for the selected business rules.
+Changing the promotion or the air pollution updates the forecast without submitting a scenario.
+
+<|{create_what_if_chart(scenario_list, selected_store, selected_week_start, promo_flag, selected_air_pollution)}|chart|properties={what_if_chart_properties}|>
+"""
+
+create_md = Markdown(create_template.substitute(what_if_preview=what_if_preview if WHAT_IF_CUBE else ""))
+
+# (store, week) lookups of _get_what_if kept, each with the what-if frame of its scenario
+WHAT_IF_CACHE_SIZE = 16
+
+
+@functools.lru_cache(maxsize=WHAT_IF_CACHE_SIZE)
+def _get_what_if(
+    scenario_ids: tuple[str, ...], selected_store: str, selected_week_start: dt.date
+) -> Optional[tuple[str, pd.DataFrame]]:
+    """Id and what_if_df of the latest scenario of the store and week whose forecasts cover every combination of
+    business rules.
+
+    Cached by the ids of the scenarios, so that the data nodes are only read again once scenarios are created or
+    deleted, and not on every change of the business rules. The returned frame is shared and must not be modified.
+    """
+
+    for scenario_id in scenario_ids:  # reverse chronological
+        scenario = tp.get(scenario_id)
+        fsr = scenario.forecast_store_request.read()
+        if fsr.store_id != selected_store or fsr.dates[0] != selected_week_start:
+            continue
+        # older scenarios may have been created without the what_if_df data node, or with WHAT_IF_CUBE disabled
+        what_if_dn = scenario.data_nodes.get("what_if_df")
+        if what_if_dn is not None and what_if_dn.is_ready_for_reading:
+            what_if_df = what_if_dn.read()
+            if what_if_df is not None:
+                return scenario_id, what_if_df
+    return None
+
+
+def create_what_if_chart(scenario_list, selected_store, selected_week_start, promo_flag, selected_air_pollution):
+    what_if = _get_what_if(tuple(s.id for s in scenario_list), selected_store, selected_week_start)
+    if what_if is None:
+        # empty df with relevant columns for (empty) chart to render
+        return pd.DataFrame([], columns=["start_time_str", *FORECASTER_KEYS])
+
+    _, what_if_df = what_if
+    what_if_df = what_if_df[
+        (what_if_df.indicator == "Sales")
+        & (what_if_df.promo == int(promo_flag))
+        & (what_if_df.pollution == int(selected_air_pollution))
+    ]
+    fcst_keys = [key for key in FORECASTER_KEYS if key in what_if_df]
+    chart_df = what_if_df.groupby("start_time")[fcst_keys].sum().reset_index()
+    chart_df["start_time_str"] = chart_df.start_time.astype(str)
+
+    return chart_df
+
+what_if_chart_properties = {
+    "x": "start_time_str",
+    "y": FORECASTER_KEYS,
+    **{f"name[{i}]": forecasters[key].label for i, key in enumerate(FORECASTER_KEYS, start=1)},
+    "mode": "lines",
+    "layout": dict(
+        hovermode="x unified",
+        xaxis=dict(title="Start time"),
+        yaxis=dict(title="Sales"),
+    ),
+}
 
 
 def create_scenario(state):
@@ -91,15 +166,15 @@ def create_scenario(state):
         store_id=state.selected_store, 
         dates=[state.selected_week_start + dt.timedelta(days=n) for n in range(7)]
     )
-    scenario = tp.create_scenario(sales_forecast_scenario_cfg, name=fsr_to_label(fsr))
-    scenario.name += f" | id={scenario.id[-4:]}"
-    scenario.forecast_store_request.write(fsr)
-    scenario.cutoff_date.write(state.selected_week_start)
-    scenario.promo_flag.write(state.promo_flag)
-    scenario.air_pollution.write(int(state.selected_air_pollution))
-    notify(state, "I", "Scenario submitted. Please wait...")
-    scenario.submit(wait=True)
-    notify(state, "S", "Scenario executed successfully!")
+    scenario, is_new = get_or_create_scenario(
+        fsr, state.selected_week_start, state.promo_flag, int(state.selected_air_pollution)
+    )
+    if is_new:
+        notify(state, "I", "Scenario submitted. Please wait...")
+        scenario.submit(wait=True)
+        notify(state, "S", "Scenario executed successfully!")
+    else:
+        notify(state, "I", "An identical scenario already exists, it is selected instead.")
     state.scenario_list = get_ordered_scenarios()
     state.selected_scenario = scenario
 
@@ -108,6 +183,9 @@ def create_on_init(state):
 
 root_var_update_list = ["selected_scenario", "scenario_list"]
 def create_on_navigate(state):
+    # stores may have been added since startup
+    state.store_list = list(get_tree_mappings().keys())
+    prefetch_store(state.selected_store, state.selected_week_start, FORECASTER_KEYS)
     for var_name in root_var_update_list:
         create_on_change(state, var_name, getattr(state, var_name))
 
@@ -117,5 +195,6 @@ def create_on_change(state, var_name, var_value):
         ...
 
     # module variables
-    elif var_name == "":
-        ...
\ No newline at end of file
+    elif var_name in ("selected_store", "selected_week_start"):
+        # warm the data of the selection in the background, so that Submit runs against it
+        prefetch_store(state.selected_store, state.selected_week_start, FORECASTER_KEYS)
\ No newline at end of file
@@ -11,15 +11,17 @@ from taipy.gui.data.decimator import MinMaxDecimator
 from string import Template
 import pandas as pd
 import datetime as dt
+from db.crud import get_tree_mappings, read_df
+from db.rollups import FREQ_DAY, FREQ_MONTH, FREQ_WEEK, read_rollup
 
 
 indicator_list = []
 selected_indicator = None
 
 _FREQ_30MIN = "30min"
-_FREQ_DAY = "day"
-_FREQ_WEEK = "week"
-_FREQ_MONTH = "month"
+_FREQ_DAY = FREQ_DAY
+_FREQ_WEEK = FREQ_WEEK
+_FREQ_MONTH = FREQ_MONTH
 aggregation_frequency_lov = [_FREQ_30MIN, _FREQ_DAY, _FREQ_WEEK, _FREQ_MONTH]
 selected_aggregation_frequency = aggregation_frequency_lov[1]
 
@@ -92,17 +94,13 @@ def create_indicator_over_time_chart(selected_scenario: Optional[tp.Scenario], s
         # empty df with relevant columns for (empty) chart to render
         return pd.DataFrame([], columns=["start_time_str", *all_sections])
 
-    store_df: pd.DataFrame = selected_scenario.store_df.read()
-
-    # groupby selected_aggregation_frequency
-    if selected_aggregation_frequency != _FREQ_30MIN:
-        if selected_aggregation_frequency == _FREQ_DAY:
-            store_df["start_time"] = store_df.start_time.dt.to_period("D")
-        elif selected_aggregation_frequency == _FREQ_WEEK:
-            store_df["start_time"] = store_df.start_time.dt.to_period('W-SUN').dt.start_time
-        elif selected_aggregation_frequency == _FREQ_MONTH:
-            store_df["start_time"] = store_df.start_time.dt.to_period('M').dt.start_time
-        store_df = store_df.groupby(by=["store_id", "section", "indicator", "start_time"], observed=True).value.sum().reset_index()
+    # same rows as the scenario's store_df (see tpconfig.tp_get_store_df), aggregated by the materialized rollups
+    store_id = selected_scenario.forecast_store_request.read().store_id
+    cutoff_date = selected_scenario.cutoff_date.read()
+    if selected_aggregation_frequency == _FREQ_30MIN:
+        store_df = read_df(store_id, end=cutoff_date, columns=["section", "indicator", "start_time", "value"])
+    else:
+        store_df = read_rollup(store_id, selected_aggregation_frequency, end=cutoff_date)
 
 
     # assigning CategoricalDtype with all_sections allows pivot_table (with observed=False) to generate even absent 
@@ -136,5 +134,9 @@ def data_on_change(state, var_name, var_value):
 
     # module variables
     elif var_name == "selected_scenario":
-        state.indicator_list = var_value.store_df.read().indicator.drop_duplicates().tolist() if var_value is not None else []
+        if var_value is not None:
+            sections = get_tree_mappings()[var_value.forecast_store_request.read().store_id]
+            state.indicator_list = list(dict.fromkeys(indicator for indicators in sections.values() for indicator in indicators))
+        else:
+            state.indicator_list = []
         state.selected_indicator = state.indicator_list[0] if state.indicator_list else None
\ No newline at end of file
@@ -6,10 +6,10 @@ import taipy as tp
 from string import Template
 import pandas as pd
 from db.crud import get_tree_mappings
+import numpy as np
 from sklearn.metrics import mean_squared_error
-from tpconfig.tpconfig import FCST_SMA_KEY, FCST_XGB_KEY
-
-tree_mappings = get_tree_mappings()
+from algo.registry import forecasters
+from tpconfig.tpconfig import FORECASTER_KEYS
 
 section_list = []
 selected_section = None
@@ -45,20 +45,8 @@ $_chart_md
 
 <|Forecast Metrics - {selected_section}/{selected_indicator}|text|class_name=h3|> <br/>
 
-<kpi|layout|columns=15em 15em|
-
-<|card p-half m-half text-center card-font card-bg|
-**SMA MSE**{: .color-primary}
-
-<|{metrics_df.loc[(metrics_df.section==selected_section) & (metrics_df.indicator==selected_indicator), 'mse_forecast_sma'].item() if not metrics_df.empty else 0}|text|raw|format=%,.2f|>
-|>
-
-<|card p-half m-half text-center card-font card-bg|
-**XGB MSE**{: .color-primary}
-
-<|{metrics_df.loc[(metrics_df.section==selected_section) & (metrics_df.indicator==selected_indicator), 'mse_forecast_xgb'].item() if not metrics_df.empty else 0}|text|raw|format=%,.2f|>
-|>
-
+<kpi|layout|columns=$_kpi_columns|
+$_kpi_md
 |kpi>
 
 ### Forecast Metrics - All Sections/Indicators
@@ -103,43 +91,64 @@ _chart_md = """\
 |>
 """
 
-forecast_md = Markdown(forecast_template.substitute(_chart_md=_chart_md))
+# one MSE card per model run by the scenarios
+_kpi_card_md = """
+<|card p-half m-half text-center card-font card-bg|
+**{label} MSE**{{: .color-primary}}
+
+<|{{metrics_df.loc[(metrics_df.section==selected_section) & (metrics_df.indicator==selected_indicator), '{mse_key}'].item() if '{mse_key}' in metrics_df else 0}}|text|raw|format=%,.2f|>
+|>
+"""
+
+
+def _mse_key(fcst_key: str) -> str:
+    return f"mse_{fcst_key}"
+
+
+_kpi_md = "".join(_kpi_card_md.format(label=forecasters[key].label, mse_key=_mse_key(key)) for key in FORECASTER_KEYS)
+_kpi_columns = " ".join(["15em"] * len(FORECASTER_KEYS))
+
+forecast_md = Markdown(forecast_template.substitute(_chart_md=_chart_md, _kpi_md=_kpi_md, _kpi_columns=_kpi_columns))
 
 
 def create_metrics_table(selected_scenario: Optional[tp.Scenario]) -> pd.DataFrame:
-    MSE_FCST_SMA_KEY = "mse_forecast_sma"
-    MSE_FCST_XGB_KEY = "mse_forecast_xgb"
     if selected_scenario is None:
         # empty df with relevant columns for (empty) table to render
-        return pd.DataFrame([], columns=["section", "indicator", MSE_FCST_SMA_KEY, MSE_FCST_XGB_KEY])
+        return pd.DataFrame([], columns=["section", "indicator", *map(_mse_key, FORECASTER_KEYS)])
 
     data_df: pd.DataFrame = selected_scenario.data_df.read()
+    # older scenarios may have been run with other models
+    fcst_keys = [key for key in forecasters if key in data_df]
     metrics_table_df = data_df.groupby(by=["section", "indicator"], observed=True).apply(lambda grp: pd.Series({
-        MSE_FCST_SMA_KEY: mean_squared_error(grp.value, grp[FCST_SMA_KEY]),
-        MSE_FCST_XGB_KEY: mean_squared_error(grp.value, grp[FCST_XGB_KEY])
+        _mse_key(key): mean_squared_error(grp.value, grp[key]) for key in fcst_keys
     })).reset_index()
 
     return metrics_table_df
 
-SMA_RESIDUALS_KEY = "sma_residuals"
-XGB_RESIDUALS_KEY = "xgb_residuals"
+
+def _residuals_key(fcst_key: str) -> str:
+    # e.g. "forecast_sma" -> "sma_residuals"
+    return f"{fcst_key.removeprefix('forecast_')}_residuals"
+
+
+RESIDUALS_KEYS = [_residuals_key(key) for key in FORECASTER_KEYS]
 def create_residuals_chart(selected_scenario, selected_section, selected_indicator):
     if selected_scenario is None:
         # empty df with relevant columns for (empty) chart to render
-        return pd.DataFrame([], columns=["start_time_str", SMA_RESIDUALS_KEY, XGB_RESIDUALS_KEY])
+        return pd.DataFrame([], columns=["start_time_str", *RESIDUALS_KEYS])
 
     data_df: pd.DataFrame = selected_scenario.data_df.read()
     residuals_df = data_df.loc[(data_df.section == selected_section) & (data_df.indicator == selected_indicator), :].copy()
 
     residuals_df["start_time_str"] = residuals_df.start_time.astype(str)
-    residuals_df[SMA_RESIDUALS_KEY] = residuals_df.value - residuals_df[FCST_SMA_KEY]
-    residuals_df[XGB_RESIDUALS_KEY] = residuals_df.value - residuals_df[FCST_XGB_KEY]
+    for key, residuals_key in zip(FORECASTER_KEYS, RESIDUALS_KEYS):
+        residuals_df[residuals_key] = residuals_df.value - residuals_df.get(key, np.nan)
 
     return residuals_df
 
 residuals_chart_properties = {
     "x": "start_time_str",
-    "y": [SMA_RESIDUALS_KEY, XGB_RESIDUALS_KEY],
+    "y": RESIDUALS_KEYS,
     "mode": "lines",
     "layout": dict(
         title=dict(text="Residuals Over Time"),
@@ -150,14 +159,10 @@ residuals_chart_properties = {
 }
 
 residuals_histogram_properties = {
-    "x": [SMA_RESIDUALS_KEY, XGB_RESIDUALS_KEY],
-    "name[1]": SMA_RESIDUALS_KEY,
-    "name[2]": XGB_RESIDUALS_KEY,
+    "x": RESIDUALS_KEYS,
+    **{f"name[{i}]": key for i, key in enumerate(RESIDUALS_KEYS, start=1)},
     "type": "histogram",
-    "options": [
-        dict(opacity=0.5),
-        dict(opacity=0.5),
-    ],
+    "options": [dict(opacity=0.5) for _ in RESIDUALS_KEYS],
     "layout": dict(
         title=dict(text="Residuals Histogram"),
         barmode="overlay",
@@ -169,17 +174,18 @@ residuals_histogram_properties = {
 def create_values_chart(selected_scenario, selected_section, selected_indicator):
     if selected_scenario is None:
         # empty df with relevant columns for (empty) chart to render
-        return pd.DataFrame([], columns=["start_time_str", FCST_SMA_KEY, FCST_XGB_KEY, "value"])
+        return pd.DataFrame([], columns=["start_time_str", *FORECASTER_KEYS, "value"])
 
     data_df: pd.DataFrame = selected_scenario.data_df.read()
     values_df = data_df.loc[(data_df.section == selected_section) & (data_df.indicator == selected_indicator), :].copy()
     values_df["start_time_str"] = values_df.start_time.astype(str)
+    values_df = values_df.assign(**{key: np.nan for key in FORECASTER_KEYS if key not in values_df})
 
     return values_df
 
 values_chart_properties = {
     "x": "start_time_str",
-    "y": [FCST_SMA_KEY, FCST_XGB_KEY, "value"],
+    "y": [*FORECASTER_KEYS, "value"],
     "mode": "lines",
     "layout": dict(
         title=dict(text="Values Over Time"),
@@ -190,16 +196,10 @@ values_chart_properties = {
 }
 
 values_histogram_properties = {
-    "x": [FCST_SMA_KEY, FCST_XGB_KEY, "value"],
-    "name[1]": SMA_RESIDUALS_KEY,
-    "name[2]": XGB_RESIDUALS_KEY,
-    "name[3]": "value",
+    "x": [*FORECASTER_KEYS, "value"],
+    **{f"name[{i}]": key for i, key in enumerate([*FORECASTER_KEYS, "value"], start=1)},
     "type": "histogram",
-    "options": [
-        dict(opacity=0.5),
-        dict(opacity=0.5),
-        dict(opacity=0.5),
-    ],
+    "options": [dict(opacity=0.5) for _ in [*FORECASTER_KEYS, "value"]],
     "layout": dict(
         title=dict(text="Values Histogram"),
         barmode="overlay",
@@ -223,7 +223,7 @@ def forecast_on_change(state, var_name, var_value):
             state.section_list = []
             state.selected_section = None
         else:
-            state.section_list = list(tree_mappings[var_value.forecast_store_request.read().store_id].keys())
+            state.section_list = list(get_tree_mappings()[var_value.forecast_store_request.read().store_id].keys())
             state.selected_section = state.section_list[0]
         state.metrics_df = create_metrics_table(var_value)
 
@@ -233,5 +233,6 @@ def forecast_on_change(state, var_name, var_value):
             state.indicator_list = []
             state.selected_indicator = None
         else:
-            state.indicator_list = tree_mappings[state.selected_scenario.forecast_store_request.read().store_id][var_value]
+            store_id = state.selected_scenario.forecast_store_request.read().store_id
+            state.indicator_list = get_tree_mappings()[store_id][var_value]
             state.selected_indicator = state.indicator_list[0]
\ No newline at end of file
@@ -19,8 +19,10 @@ from pages.create import create_md, create_on_init, create_on_change, create_on_
 from pages.data import data_md, data_on_init, data_on_change, data_on_navigate
 from pages.forecast import forecast_md, forecast_on_init, forecast_on_change, forecast_on_navigate
 from pages.compare import compare_md, compare_on_init, compare_on_change, compare_on_navigate
-from pages.common import fsr_to_label, create_scenario_summary_df, get_ordered_scenarios, year_week_adapter
-from tpconfig.tpconfig import forecast_dates, sales_forecast_scenario_cfg
+from pages.common import create_scenario_summary_df, get_or_create_scenario, get_ordered_scenarios, year_week_adapter
+from algo.feature_store import ensure_feature_store
+from algo.registry import XGB_USE_FEATURE_STORE
+from tpconfig.tpconfig import forecast_dates
 
 create_scenario_summary_df
 year_week_adapter
@@ -169,18 +171,17 @@ def create_first_scenario():
     fsr = ForecastStoreRequest(store_id="001", dates=[selected_week_start + dt.timedelta(days=n) for n in range(7)])
     promo_flag = True
     air_pollution = 0
-    scenario = tp.create_scenario(sales_forecast_scenario_cfg, name=fsr_to_label(fsr))
-    scenario.name += f" | id={scenario.id[-4:]}"
-    scenario.forecast_store_request.write(fsr)
-    scenario.cutoff_date.write(selected_week_start)
-    scenario.promo_flag.write(promo_flag)
-    scenario.air_pollution.write(air_pollution)
-    tp.submit(scenario, wait=True)
+    scenario, is_new = get_or_create_scenario(fsr, selected_week_start, promo_flag, air_pollution)
+    if is_new:
+        tp.submit(scenario, wait=True)
 
 
 if __name__ == "__main__":
     tp.Core().run()
 
+    if XGB_USE_FEATURE_STORE:
+        # built before serving, rather than by the first scenario that needs it
+        ensure_feature_store()
     create_first_scenario()
 
     stylekit = {
@@ -0,0 +1,74 @@
+"""Shared fixtures: every test reads a small generated dataset in a temporary data directory.
+
+SALES_DATA_DIR is set before db.crud is imported, so that the data and every file derived from it (dataset, feature
+store, rollups, indexes) are written there instead of the data directory of the repository.
+"""
+
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+repo_path = Path(__file__).parent.parent
+sys.path.insert(0, str(repo_path))
+
+_tmp_path = Path(tempfile.mkdtemp(prefix="sales-tests-"))
+os.environ["SALES_DATA_DIR"] = str(_tmp_path / "data")
+
+N_STORES = 2
+
+
+def _load_generator():
+    # loaded from its path: the data.py module at the root of the repository shadows the data directory
+    spec = importlib.util.spec_from_file_location("_data_generator", repo_path / "data" / "data.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def pytest_sessionstart(session):
+    data_dir = Path(os.environ["SALES_DATA_DIR"])
+    data_dir.mkdir(parents=True)
+    _load_generator().get_data(n_stores=N_STORES).to_parquet(_tmp_path / "sales.parquet", index=False)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_tmp_path, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def sales_data():
+    """Path of the generated data, restored (and the files derived from it removed) after each test."""
+
+    from db.crud import df_parquet_path
+
+    shutil.copyfile(_tmp_path / "sales.parquet", df_parquet_path)
+    yield df_parquet_path
+
+    for path in df_parquet_path.parent.iterdir():
+        shutil.rmtree(path) if path.is_dir() and not path.is_symlink() else path.unlink()
+
+
+@pytest.fixture(autouse=True)
+def model_cache(tmp_path, monkeypatch):
+    """Empty model cache of the test, instead of the models of the repository."""
+
+    import algo.forecast
+    from algo.model_cache import ModelCache
+
+    cache = ModelCache(tmp_path / "models")
+    monkeypatch.setattr(algo.forecast, "model_cache", cache)
+    return cache
+
+
+@pytest.fixture(scope="session")
+def sales_df():
+    """The generated data, as read from the Parquet file."""
+
+    import pandas as pd
+
+    return pd.read_parquet(_tmp_path / "sales.parquet")
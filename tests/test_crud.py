@@ -0,0 +1,279 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import db.crud
+import db.sqlite
+from db.crud import _read_parquet, append_df, df_columns, get_tree_mappings, read_df, write_dataset
+
+QUERIES = {
+    "all": dict(),
+    "store": dict(store_id="002"),
+    "series": dict(store_id="001", section_indicator=("SIDES", "Items")),
+    "series of all stores": dict(section_indicator=("BEVERAGE", "Transactions")),
+    "store week": dict(store_id="001", start=pd.Timestamp("2024-01-01"), end=pd.Timestamp("2024-01-08")),
+    "history": dict(store_id="002", end=pd.Timestamp("2024-01-01 12:30")),
+    "from": dict(start=pd.Timestamp("2024-03-25")),
+    "columns": dict(store_id="001", end=pd.Timestamp("2023-02-01"), columns=["start_time", "value"]),
+    "unknown store": dict(store_id="999"),
+}
+
+
+def _filter(df: pd.DataFrame, store_id=None, section_indicator=None, start=None, end=None, columns=None):
+    mask = pd.Series(True, index=df.index)
+    if store_id:
+        mask &= df.store_id == store_id
+    if section_indicator:
+        mask &= (df.section == section_indicator[0]) & (df.indicator == section_indicator[1])
+    if start is not None:
+        mask &= df.start_time >= start
+    if end is not None:
+        mask &= df.start_time < end
+    return df.loc[mask, columns or df_columns]
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """df with plain string keys, in a canonical row order, as the backends order rows differently."""
+
+    df = df.astype({col: str for col in ["store_id", "section", "indicator"] if col in df})
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+@pytest.fixture(params=["file", "dataset", "dataset by section"])
+def layout(request):
+    """The layouts of the data read by read_df, see db.crud.write_dataset."""
+
+    if request.param != "file":
+        write_dataset(read_df(), partition_by_section=request.param == "dataset by section", row_group_size=4096)
+    return request.param
+
+
+@pytest.fixture(params=["cache", "ipc", "parquet", "sqlite"])
+def read(request, monkeypatch):
+    """The access paths of read_df."""
+
+    if request.param == "ipc":
+        monkeypatch.setattr(db.crud, "USE_IPC_STORE", True)
+    if request.param == "sqlite":
+        monkeypatch.setattr(db.crud, "USE_SQLITE_STORE", True)
+    if request.param == "parquet":
+        return _read_parquet
+    return read_df
+
+
+@pytest.fixture(scope="module")
+def expected_dfs(sales_df) -> dict[str, pd.DataFrame]:
+    return {name: _normalize(_filter(sales_df, **query)) for name, query in QUERIES.items()}
+
+
+def test_read_df_matches_pandas_filter(expected_dfs, layout, read):
+    for name, query in QUERIES.items():
+        df = read(**query)
+
+        assert list(df.columns) == query.get("columns", df_columns), name
+        pd.testing.assert_frame_equal(_normalize(df), expected_dfs[name], check_dtype=False, obj=name)
+
+
+def test_read_df_series_are_sorted(sales_df):
+    df = read_df(store_id="001", end=pd.Timestamp("2024-01-01"))
+
+    for _, series_df in df.groupby(["section", "indicator"], observed=True):
+        assert series_df.start_time.is_monotonic_increasing
+
+
+def test_read_sqlite_trims_the_weeks_of_the_bounds():
+    # neither bound on a Monday, the first day of the chunks of the database
+    df = db.sqlite.read_sqlite(store_id="001", start=pd.Timestamp("2024-01-03 12:00"), end=pd.Timestamp("2024-01-17"))
+
+    assert df.start_time.min() == pd.Timestamp("2024-01-03 12:00")
+    assert df.start_time.max() == pd.Timestamp("2024-01-16 23:30")
+    assert len(df) == 9 * (13 * 48 + 24)
+    for _, series_df in df.groupby(["section", "indicator"], observed=True):
+        assert series_df.start_time.is_monotonic_increasing
+
+
+def _new_rows(sales_df: pd.DataFrame, store_id: str, start: pd.Timestamp, n_slots: int) -> pd.DataFrame:
+    """n_slots new rows after the data, for every series of store_id (copied from the first series of the store)."""
+
+    store_df = sales_df[sales_df.store_id == sales_df.store_id.iloc[0]].astype({"store_id": str})
+    new_df = store_df[store_df.start_time < store_df.start_time.min() + n_slots * pd.Timedelta(minutes=30)]
+    return new_df.assign(store_id=store_id, start_time=new_df.start_time - new_df.start_time.min() + start)
+
+
+def test_append_df(sales_df):
+    start = sales_df.start_time.max() + pd.Timedelta(minutes=30)
+    new_df = pd.concat([_new_rows(sales_df, "001", start, 48), _new_rows(sales_df, "003", start, 48)])
+
+    assert append_df(new_df) == len(new_df)
+
+    pd.testing.assert_frame_equal(
+        _normalize(read_df(start=start)), _normalize(new_df[df_columns]), check_dtype=False
+    )
+    assert len(read_df()) == len(sales_df) + len(new_df)
+    assert get_tree_mappings()["003"] == get_tree_mappings()["001"]
+
+
+def test_appends_update_the_sqlite_database(sales_df, monkeypatch):
+    monkeypatch.setattr(db.crud, "USE_SQLITE_STORE", True)
+    n_rows = len(read_df())  # builds the database
+    monkeypatch.setattr(db.sqlite, "build_sqlite", lambda *args: pytest.fail("database rebuilt"))
+
+    start = sales_df.start_time.max() + pd.Timedelta(minutes=30)
+    # the second day of each store is written into the chunk of the first day, the week being the same
+    new_dfs = [_new_rows(sales_df, store_id, start, 96) for store_id in ["001", "003"]]
+    for day in range(2):
+        day_df = pd.concat([new_df.iloc[day * 9 * 48 : (day + 1) * 9 * 48] for new_df in new_dfs])
+        append_df(day_df.sort_values(["store_id", "section", "indicator", "start_time"]))
+
+    new_df = pd.concat(new_dfs)
+    pd.testing.assert_frame_equal(_normalize(read_df(start=start)), _normalize(new_df[df_columns]), check_dtype=False)
+    assert len(read_df()) == n_rows + len(new_df)
+
+
+def test_sqlite_chunks_are_little_endian():
+    week_start = pd.Timestamp("2024-01-01")
+    df = db.sqlite.read_sqlite("001", ("MAINS", "Sales"), start=week_start, end=week_start + pd.Timedelta(weeks=1))
+
+    with db.sqlite._get_engine().connect() as conn:
+        blob = conn.exec_driver_sql(
+            "SELECT value FROM sales_chunks WHERE store_id = ? AND section = ? AND indicator = ? AND week_start = ?",
+            ("001", "MAINS", "Sales", week_start.value),
+        ).scalar_one()
+
+    np.testing.assert_array_equal(np.frombuffer(blob, dtype="<i8"), df.value.to_numpy())
+
+
+def test_append_df_compacts_partitions(sales_df):
+    start = sales_df.start_time.max() + pd.Timedelta(minutes=30)
+    for n in range(4):
+        append_df(_new_rows(sales_df, "001", start + n * pd.Timedelta(hours=1), 2), max_fragments=2)
+
+    assert len(list(db.crud.df_source_path().glob("store_id=001/*.parquet"))) <= 2
+    assert len(read_df(store_id="001", start=start)) == 4 * 2 * 9
+    assert not read_df().duplicated(["store_id", "section", "indicator", "start_time"]).any()
+
+
+def test_reads_during_compaction_see_each_row_once(sales_df):
+    start = sales_df.start_time.max() + pd.Timedelta(minutes=30)
+    append_df(_new_rows(sales_df, "001", start, 1))
+    stop = threading.Event()
+    n_rows, n_duplicates = [], []
+
+    def read_files():
+        # the Parquet files themselves, not the in-memory cache of read_df
+        while not stop.is_set():
+            df = _read_parquet(store_id="001", start=start)
+            n_rows.append(len(df))
+            n_duplicates.append(df.duplicated(["section", "indicator", "start_time"]).sum())
+
+    reader = threading.Thread(target=read_files)
+    reader.start()
+    try:
+        for n in range(1, 16):
+            # compacts the partition every other append
+            append_df(_new_rows(sales_df, "001", start + n * pd.Timedelta(minutes=30), 1), max_fragments=2)
+    finally:
+        stop.set()
+        reader.join()
+
+    assert len(n_rows) > 15
+    assert sum(n_duplicates) == 0
+    # rows only ever appear
+    assert n_rows == sorted(n_rows) and n_rows[-1] == 16 * 9
+
+
+def test_write_dataset_replaces_the_previous_version(sales_df):
+    write_dataset(read_df())
+    previous_path = db.crud.df_source_path()
+
+    write_dataset(read_df(store_id="002"))
+
+    assert db.crud.df_source_path() != previous_path
+    assert read_df().store_id.unique().tolist() == ["002"]
+    # kept for its readers until RETIRED_VERSION_SECONDS have passed
+    assert len(_read_parquet()) == len(read_df())
+    assert previous_path.exists()
+
+
+def test_write_ipc_without_schema_metadata(monkeypatch):
+    read_table = db.crud._read_table
+    monkeypatch.setattr(db.crud, "_read_table", lambda *args: read_table(*args).replace_schema_metadata(None))
+
+    db.crud.write_ipc()
+
+    assert db.crud.df_ipc_path.exists()
+
+
+def test_ipc_file_is_written_outside_the_cache_lock(sales_data, monkeypatch):
+    monkeypatch.setattr(db.crud, "USE_IPC_STORE", True)
+    n_rows = len(read_df(store_id="001"))
+
+    write_ipc = db.crud.write_ipc
+    started, release = threading.Event(), threading.Event()
+
+    def slow_write_ipc():
+        started.set()
+        release.wait(timeout=30)
+        write_ipc()
+
+    monkeypatch.setattr(db.crud, "write_ipc", slow_write_ipc)
+    sales_data.touch()  # the IPC file is now older than the data
+    writer = threading.Thread(target=read_df)
+    writer.start()
+    try:
+        assert started.wait(timeout=30)
+        # served from the loaded table while the file is being written
+        read_n_rows = []
+        reader = threading.Thread(target=lambda: read_n_rows.append(len(read_df(store_id="001"))))
+        reader.start()
+        reader.join(timeout=10)
+        assert read_n_rows == [n_rows]
+    finally:
+        release.set()
+        writer.join()
+
+
+def test_cache_size_is_checked_before_reading(monkeypatch):
+    monkeypatch.setattr(db.crud._dataset_cache, "max_bytes", 2**20)
+    read_tables = []
+    read_table = db.crud._read_table
+    monkeypatch.setattr(db.crud, "_read_table", lambda *args: read_tables.append(args) or read_table(*args))
+
+    df = read_df(store_id="001", section_indicator=("MAINS", "Sales"))
+
+    assert len(df) == len(read_df(store_id="002", section_indicator=("MAINS", "Sales")))
+    # the Parquet reader with the filters pushed down, never the full table for the cache
+    assert read_tables and all(filters for _, filters, _ in read_tables)
+
+
+def test_reads_during_reloads_are_consistent(sales_data, sales_df):
+    # two versions of the data, with different row ranges per series
+    short_df = sales_df[sales_df.start_time < pd.Timestamp("2023-06-01")]
+    versions = {len(df[df.store_id == "002"]) // 9: df for df in [sales_df, short_df]}
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        while not stop.is_set():
+            df = read_df(store_id="002", section_indicator=("SIDES", "Items"))
+            if len(df) not in versions or not df.start_time.is_monotonic_increasing or df.section.nunique() != 1:
+                errors.append(df)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for n in range(6):
+            tmp_path = sales_data.with_name(".replaced.parquet")
+            list(versions.values())[n % 2].to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, sales_data)
+            read_df(store_id="001")  # reloads the cache
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert errors == []
@@ -0,0 +1,104 @@
+import datetime as dt
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import algo.feature_store
+from algo.backtest import run_backtest
+from algo.feature_store import (
+    build_feature_store,
+    feature_store_path,
+    read_features,
+    read_training_matrices,
+    update_feature_store,
+)
+from algo.forecast import _apply_features, feature_cols
+from algo.registry import FCST_SMA_KEY, FCST_XGB_KEY
+from db.crud import append_df, read_df
+
+end = pd.Timestamp("2024-01-07 23:30")
+
+
+def test_read_features_matches_apply_features():
+    features_df = read_features("002", end=end)
+
+    store_df = read_df("002", end=end + pd.Timedelta(minutes=30)).drop(columns="store_id")
+    for (section, indicator), series_df in store_df.groupby(["section", "indicator"], observed=True):
+        expected_df = _apply_features(series_df.drop(columns=["section", "indicator"]).reset_index(drop=True))
+        _features_df = features_df[(features_df.section == section) & (features_df.indicator == indicator)]
+        np.testing.assert_allclose(
+            _features_df[feature_cols].to_numpy(), expected_df[feature_cols].to_numpy(dtype=np.float32), rtol=1e-6
+        )
+        np.testing.assert_array_equal(_features_df.start_time.to_numpy(), expected_df.start_time.to_numpy())
+
+
+def test_read_training_matrices():
+    matrices = read_training_matrices("001", end=end)
+
+    assert len(matrices) == 9
+    X, y = matrices[("SIDES", "Items")]
+    features_df = read_features("001", end=end)
+    features_df = features_df[(features_df.section == "SIDES") & (features_df.indicator == "Items")]
+    np.testing.assert_array_equal(X, features_df[feature_cols].to_numpy(dtype=np.float32))
+    np.testing.assert_array_equal(y, features_df.y.to_numpy(dtype=np.float32))
+
+
+def test_concurrent_builds_across_processes():
+    # every process finds the feature store missing: one builds it, the others wait for it
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        lengths = list(executor.map(len, executor.map(read_features, ["001", "002"] * 4)))
+
+    assert lengths == [len(read_features("001")), len(read_features("002"))] * 4
+    assert [path.name for path in feature_store_path.iterdir()] == ["part-0.parquet"]
+
+
+def test_backtest_builds_the_feature_store_before_its_workers():
+    metrics_df = run_backtest(
+        ["001", "002"], weeks=[dt.date(2024, 1, 8)], keys=[FCST_SMA_KEY, FCST_XGB_KEY], max_workers=2, output_path=None
+    )
+
+    assert len(metrics_df) == 2 * 9 * 2
+    assert metrics_df.mae.notna().all()
+
+
+def test_update_after_append_matches_rebuild():
+    build_feature_store()
+    df = read_df(start=pd.Timestamp("2024-03-25"))
+    append_df(df.assign(start_time=df.start_time + pd.Timedelta(weeks=1)))
+
+    sort_cols = ["section", "indicator", "start_time"]
+    updated_df = read_features("001").sort_values(sort_cols, ignore_index=True)
+    build_feature_store()
+    pd.testing.assert_frame_equal(updated_df, read_features("001").sort_values(sort_cols, ignore_index=True))
+
+
+def test_reads_during_compaction_see_each_row_once(monkeypatch):
+    build_feature_store()
+    # every update compacts the store
+    monkeypatch.setattr(algo.feature_store, "_MAX_FRAGMENTS", 1)
+    stop = threading.Event()
+    n_rows, n_duplicates = [], []
+
+    def read():
+        while not stop.is_set():
+            features_df = read_features("002")
+            n_rows.append(len(features_df))
+            n_duplicates.append(features_df.duplicated(["section", "indicator", "start_time"]).sum())
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        df = read_df(start=pd.Timestamp("2024-03-31"))
+        for n in range(1, 6):
+            append_df(df.assign(start_time=df.start_time + pd.Timedelta(days=n)))
+    finally:
+        stop.set()
+        reader.join()
+
+    assert len(n_rows) > 5
+    assert sum(n_duplicates) == 0
+    # rows only ever appear
+    assert n_rows == sorted(n_rows) and n_rows[-1] == len(read_df("002"))
@@ -0,0 +1,166 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import algo.forecast
+from algo.forecast import (
+    XGB_MAX_BIN,
+    XGB_TREE_METHOD,
+    _fit_n_weeks,
+    _n_direct_weeks,
+    _new_xgb,
+    _prepare_global_df,
+    fit_xgb_global,
+    forecast_last_week,
+    forecast_sma,
+    forecast_xgb,
+    forecast_xgb_global,
+)
+from db.crud import read_df
+
+
+def _week(week_start: dt.date, n_weeks: int = 1) -> list[dt.date]:
+    return [week_start + dt.timedelta(days=n) for n in range(7 * n_weeks)]
+
+
+@pytest.fixture
+def series(sales_df) -> pd.Series:
+    """Sales of a single series on the regular 30-minute grid."""
+
+    series_df = sales_df[
+        (sales_df.store_id == "001") & (sales_df.section == "MAINS") & (sales_df.indicator == "Sales")
+    ]
+    return series_df.set_index("start_time").value.sort_index()
+
+
+def _forecast_groupby(forecast_func, monkeypatch, *args, **kwargs) -> pd.Series:
+    """forecast_func without the fast path for regular series, i.e. by the (day_of_week, time) groupby."""
+
+    with monkeypatch.context() as m:
+        m.setattr(algo.forecast, "_is_regular_series", lambda series: False)
+        return forecast_func(*args, **kwargs)
+
+
+@pytest.mark.parametrize("window", [1, 4, 6])
+@pytest.mark.parametrize("cutoff, n_weeks", [(dt.date(2024, 1, 1), 1), (dt.date(2024, 3, 4), 3)])
+def test_forecast_sma_matches_groupby(series, monkeypatch, window, cutoff, n_weeks):
+    history = series[series.index < pd.Timestamp(cutoff)]
+    dates = _week(cutoff, n_weeks)
+
+    fcst = forecast_sma(history, window=window, dates=dates)
+    expected = _forecast_groupby(forecast_sma, monkeypatch, history, window=window, dates=dates)
+
+    assert len(fcst) == 7 * 48 * n_weeks
+    pd.testing.assert_series_equal(fcst, expected, check_names=False, check_freq=False)
+
+
+def test_forecast_sma_short_history(series, monkeypatch):
+    # fewer weeks of history than the window, and a partial first week: slots without any history are NaN
+    history = series[series.index < pd.Timestamp("2023-01-12")]
+    dates = _week(dt.date(2023, 1, 16))
+
+    fcst = forecast_sma(history, window=4, dates=dates)
+    expected = _forecast_groupby(forecast_sma, monkeypatch, history, window=4, dates=dates)
+
+    pd.testing.assert_series_equal(fcst, expected, check_names=False, check_freq=False)
+
+
+@pytest.mark.parametrize("cutoff, n_weeks", [(dt.date(2024, 1, 1), 1), (dt.date(2024, 3, 4), 3)])
+def test_forecast_last_week_matches_groupby(series, monkeypatch, cutoff, n_weeks):
+    history = series[series.index < pd.Timestamp(cutoff)]
+    dates = _week(cutoff, n_weeks)
+
+    fcst = forecast_last_week(history, dates=dates)
+    expected = _forecast_groupby(forecast_last_week, monkeypatch, history, dates=dates)
+
+    pd.testing.assert_series_equal(fcst, expected, check_names=False, check_freq=False)
+    # every forecast week is the last observed week
+    last_week = history.to_numpy()[-7 * 48 :]
+    np.testing.assert_array_equal(fcst.to_numpy(), np.tile(last_week, n_weeks))
+
+
+def test_forecast_defaults_to_next_week(series):
+    history = series[series.index < pd.Timestamp("2024-01-01")]
+
+    fcst = forecast_sma(history)
+
+    assert fcst.index.min() == pd.Timestamp("2024-01-01")
+    assert fcst.index.max() == pd.Timestamp("2024-01-07 23:30")
+
+
+@pytest.mark.parametrize("n_weeks", [1, 2])
+def test_direct_weeks_start_at_the_first_future_slot(series, n_weeks):
+    df = series[series.index < pd.Timestamp("2024-01-01")].reset_index()
+    dates = _week(dt.date(2024, 1, 1), n_weeks)
+
+    assert _n_direct_weeks(df, dates) == n_weeks
+    assert _fit_n_weeks(df, dates) == n_weeks
+    assert _fit_n_weeks(df, None) == 1
+
+
+def _direct_matrix(df: pd.DataFrame) -> np.ndarray:
+    """direct_feature_cols of df (columns start_time, y_lag_hw, horizon and the business features), built by hand."""
+
+    return np.column_stack([
+        df.start_time.dt.hour + df.start_time.dt.minute / 60,
+        df.start_time.dt.dayofweek >= 5,
+        df.y_lag_hw,
+        df.horizon,
+        df.promo,
+        df.pollution,
+    ]).astype(np.float32)
+
+
+def test_forecast_xgb_direct_matches_hand_built_lags(series):
+    history = series[(series.index >= pd.Timestamp("2023-10-02")) & (series.index < pd.Timestamp("2024-01-01"))]
+    df = history.reset_index().assign(promo=0, pollution=1)
+    week = pd.Timedelta(weeks=1) // algo.forecast.TIME_STEP
+
+    # every row once per horizon h, with the value h weeks earlier as its lag
+    train_df = pd.concat([df.assign(y_lag_hw=df.value.shift(h * week), horizon=h) for h in (1, 2)])
+    xgb = _new_xgb().fit(_direct_matrix(train_df), train_df.value.to_numpy(dtype=np.float32))
+    # the lag of forecast week h, h weeks earlier, is in the last observed week
+    future_df = pd.DataFrame({
+        "start_time": pd.date_range("2024-01-01", periods=2 * week, freq=algo.forecast.TIME_STEP),
+        "y_lag_hw": np.tile(df.value.to_numpy()[-week:], 2),
+        "horizon": np.repeat([1, 2], week),
+        "promo": 0,
+        "pollution": 1,
+    })
+
+    fcst = forecast_xgb(df, _week(dt.date(2024, 1, 1), 2), {"promo": 0, "pollution": 1}, strategy="direct")
+
+    np.testing.assert_array_equal(fcst.index, future_df.start_time)
+    np.testing.assert_allclose(fcst.to_numpy(), xgb.predict(_direct_matrix(future_df)), rtol=1e-6)
+
+
+@pytest.fixture
+def store_df() -> pd.DataFrame:
+    return read_df("001", start=pd.Timestamp("2023-10-02"), end=pd.Timestamp("2024-01-01"))
+
+
+def test_forecast_xgb_global(store_df):
+    xgb = fit_xgb_global(store_df)
+
+    fcst_df = forecast_xgb_global(store_df, _week(dt.date(2024, 1, 1), 2), {"promo": 0, "pollution": 1}, xgb=xgb)
+
+    assert list(fcst_df.columns) == ["start_time", "section", "indicator", "value"]
+    assert len(fcst_df) == 9 * 2 * 7 * 48
+    assert fcst_df.value.notna().all()
+    assert fcst_df.start_time.min() == pd.Timestamp("2024-01-01")
+    assert fcst_df.start_time.max() == pd.Timestamp("2024-01-14 23:30")
+    # the training settings of the per-series models
+    params = xgb.get_params()
+    assert (params["tree_method"], params["max_bin"]) == (XGB_TREE_METHOD, XGB_MAX_BIN)
+
+
+def test_global_scaling_round_trips(store_df):
+    df, scale = _prepare_global_df(store_df)
+
+    series_means = df.groupby(["section", "indicator"], observed=True).value.mean()
+    np.testing.assert_allclose(series_means[scale != 1], 1)
+    unscaled = df.value * df.join(scale, on=["section", "indicator"])["scale"]
+    expected = store_df.sort_values(["section", "indicator", "start_time"]).value
+    np.testing.assert_allclose(unscaled.to_numpy(), expected.to_numpy())
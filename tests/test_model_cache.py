@@ -0,0 +1,93 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from algo.forecast import fit_xgb, forecast_xgb, get_cached_xgb
+import algo.model_cache
+from algo.model_cache import ModelCache
+from db.crud import df_parquet_path, read_df
+
+week_start = dt.date(2024, 1, 8)
+dates = [week_start + dt.timedelta(days=n) for n in range(7)]
+cache_key = ("001", "MAINS", "Sales")
+features = {"promo": 0, "pollution": 1}
+
+
+def _series_df(end: dt.date = week_start) -> pd.DataFrame:
+    return read_df("001", section_indicator=cache_key[1:], end=end).drop(columns=["store_id", "section", "indicator"])
+
+
+def _rewrite_data(path, factor: int):
+    """Rewrite the data in place with every value multiplied by factor, as a reload of corrected data would."""
+
+    df = pd.read_parquet(path)
+    df.assign(value=df.value * factor).to_parquet(path, index=False)
+
+
+@pytest.mark.parametrize("strategy", ["recursive", "direct"])
+def test_cached_model_is_reused(strategy):
+    df = _series_df()
+
+    xgb = fit_xgb(df, dates, cache_key=cache_key, strategy=strategy)
+
+    assert fit_xgb(df, dates, cache_key=cache_key, strategy=strategy) is xgb
+    assert get_cached_xgb(df, cache_key, dates, strategy=strategy) is xgb
+
+
+@pytest.mark.parametrize("strategy", ["recursive", "direct"])
+def test_model_is_refit_after_data_is_rewritten(sales_data, strategy):
+    df = _series_df()
+    fcst = forecast_xgb(df, dates, features, strategy=strategy, xgb=fit_xgb(df, dates, cache_key, strategy=strategy))
+
+    _rewrite_data(sales_data, 10)
+    df = _series_df()
+
+    assert get_cached_xgb(df, cache_key, dates, strategy=strategy) is None
+    xgb = fit_xgb(df, dates, cache_key, strategy=strategy)
+    rewritten_fcst = forecast_xgb(df, dates, features, strategy=strategy, xgb=xgb)
+    # a model fitted on the previous data would forecast the previous scale
+    np.testing.assert_allclose(rewritten_fcst.sum() / fcst.sum(), 10, rtol=0.05)
+
+
+def test_warm_start_requires_unchanged_history(sales_data):
+    prev_df = _series_df(week_start - dt.timedelta(weeks=1))
+    fit_xgb(prev_df, cache_key=cache_key, warm_start=True)
+
+    # continued from the model of the previous week
+    xgb = fit_xgb(_series_df(), cache_key=cache_key, warm_start=True)
+    assert xgb.get_booster().attr("warm_start_generation") == "1"
+
+    _rewrite_data(sales_data, 10)
+
+    xgb = fit_xgb(_series_df(), cache_key=cache_key, warm_start=True)
+    assert xgb.get_booster().attr("warm_start_generation") is None
+
+
+def test_models_are_read_back_from_disk(model_cache):
+    df = _series_df()
+    xgb = fit_xgb(df, cache_key=cache_key)
+
+    key = next(path.stem for path in model_cache.cache_dir.glob("*.ubj"))
+    disk_xgb = ModelCache(model_cache.cache_dir).get(key)
+
+    np.testing.assert_allclose(
+        forecast_xgb(df, dates, features, xgb=disk_xgb), forecast_xgb(df, dates, features, xgb=xgb), rtol=1e-6
+    )
+
+
+def test_memory_tier_is_bounded_by_model_size(model_cache, tmp_path):
+    xgb = fit_xgb(_series_df(), cache_key=cache_key)
+    nbytes = next(model_cache.cache_dir.glob("*.ubj")).stat().st_size
+    cache = ModelCache(tmp_path / "bounded", max_memory_bytes=int(2.5 * nbytes))
+
+    for key in "abc":
+        cache.put(key, xgb)
+    assert list(cache._memory) == ["b", "c"]
+    # evicted from memory only
+    assert cache.get("a") is not None and list(cache._memory) == ["c", "a"]
+
+
+def test_models_are_stored_in_the_data_directory():
+    assert algo.model_cache.model_cache.cache_dir.parent == df_parquet_path.parent
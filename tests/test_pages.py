@@ -0,0 +1,93 @@
+import datetime as dt
+import os
+
+import pytest
+import taipy as tp
+from taipy import Config, Scope
+
+import pages.common
+import tpconfig.tpconfig
+from db.schema import ForecastStoreRequest
+from pages.common import get_or_create_scenario, get_ordered_scenarios
+
+week_start = dt.date(2024, 1, 8)
+fsr = ForecastStoreRequest(store_id="001", dates=[week_start + dt.timedelta(days=n) for n in range(7)])
+
+
+@pytest.fixture
+def core(tmp_path):
+    """Taipy Core storing the scenarios (and their data nodes) of the test in tmp_path."""
+
+    Config.configure_core(storage_folder=str(tmp_path / "data"), taipy_storage_folder=str(tmp_path / "taipy"))
+    core = tp.Core()
+    core.run()
+    yield core
+    core.stop()
+
+
+@pytest.fixture
+def create_page():
+    # imported once the data exists, the page listing the stores on import
+    import pages.create
+
+    pages.create._get_what_if.cache_clear()
+    return pages.create
+
+
+def _submit(promo_flag: bool = False, air_pollution: int = 0) -> tuple[tp.Scenario, bool]:
+    scenario, is_new = get_or_create_scenario(fsr, week_start, promo_flag, air_pollution)
+    if is_new:
+        scenario.submit(wait=True)
+    return scenario, is_new
+
+
+def test_what_if_chart_reads_the_scenarios_once(core, create_page, monkeypatch):
+    monkeypatch.setattr(tpconfig.tpconfig, "WHAT_IF_CUBE", True)
+    scenario, _ = _submit()
+    scenario_list = get_ordered_scenarios()
+
+    chart_df = create_page.create_what_if_chart(scenario_list, "001", week_start, False, "0")
+    assert len(chart_df) == 7 * 48
+
+    with monkeypatch.context() as m:
+        m.setattr(tp, "get", lambda *args: pytest.fail("scenario read"))
+        promo_chart_df = create_page.create_what_if_chart(scenario_list, "001", week_start, True, "3")
+        assert (promo_chart_df.forecast_xgb != chart_df.forecast_xgb).any()
+        assert create_page.create_what_if_chart(scenario_list, "001", week_start, False, "0").equals(chart_df)
+
+    # a new scenario of the store and week is previewed instead
+    new_scenario, _ = _submit(promo_flag=True)
+    scenario_ids = tuple(s.id for s in get_ordered_scenarios())
+    assert create_page._get_what_if(scenario_ids, "001", week_start)[0] == new_scenario.id
+
+
+def test_identical_submissions_reuse_the_scenario(core, sales_data):
+    scenario, is_new = _submit()
+    assert is_new
+
+    same_scenario, is_new = _submit()
+    assert not is_new and same_scenario.id == scenario.id
+    assert len(tp.get_scenarios()) == 1
+
+    # the same inputs against new data
+    mtime = sales_data.stat().st_mtime
+    os.utime(sales_data, (mtime + 10, mtime + 10))
+    new_scenario, is_new = _submit()
+    assert is_new and new_scenario.id != scenario.id
+    assert len(tp.get_scenarios()) == 2
+
+
+def test_scenario_code_covers_the_data_access_and_model_cache():
+    paths = {path.relative_to(path.parents[1]).as_posix() for path in pages.common._scenario_code_paths}
+
+    assert {"db/crud.py", "db/rollups.py", "algo/model_cache.py", "algo/forecast.py", "tpconfig/tpconfig.py"} <= paths
+
+
+def test_model_tasks_are_bound_to_their_key_without_data_nodes(core):
+    scenario, _ = _submit()
+
+    assert all(data_node.scope == Scope.SCENARIO for data_node in tp.get_data_nodes())
+    # the functions of the tasks are imported again from their module and name
+    task = tp.get(scenario.id).tasks["run_forecast_xgb"]
+    assert task.function is tpconfig.tpconfig.tp_run_forecast_xgb
+    assert scenario.forecast_xgb_df.read()["forecast_xgb"].notna().all()
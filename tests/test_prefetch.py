@@ -0,0 +1,82 @@
+import datetime as dt
+import os
+
+import pandas as pd
+import pytest
+
+import algo.registry
+import tpconfig.tpconfig
+from algo.prefetch import PrefetchCache, prefetch_cache, prefetch_store, store_df_key, training_matrices_key
+from algo.registry import XGBForecaster, forecasters
+from db.crud import read_df
+from db.schema import ForecastStoreRequest
+from tpconfig.tpconfig import tp_get_store_df
+
+week_start = dt.date(2024, 1, 8)
+dates = [week_start + dt.timedelta(days=n) for n in range(7)]
+FCST_XGB_FS_KEY = "forecast_xgb_feature_store"
+
+
+@pytest.fixture(autouse=True)
+def forecaster(monkeypatch) -> XGBForecaster:
+    """An XGB forecaster training on the feature store, registered for the test."""
+
+    prefetch_cache.clear()
+    forecaster = XGBForecaster(FCST_XGB_FS_KEY, "XGB (feature store)", use_feature_store=True)
+    monkeypatch.setitem(forecasters, FCST_XGB_FS_KEY, forecaster)
+    return forecaster
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError("read from disk")
+
+
+def test_scenario_tasks_read_the_prefetched_frames(forecaster, monkeypatch):
+    prefetch_store("001", week_start, [FCST_XGB_FS_KEY]).future.result()
+    expected_df = read_df("001", end=week_start)
+    monkeypatch.setattr(tpconfig.tpconfig, "read_df", _fail)
+    monkeypatch.setattr(algo.registry, "read_training_matrices", _fail)
+
+    store_df = tp_get_store_df(ForecastStoreRequest(store_id="001", dates=dates), week_start)
+    fitted = forecaster.fit_many(store_df, "001", dates)
+
+    pd.testing.assert_frame_equal(store_df, expected_df[store_df.columns])
+    assert len(fitted) == 9
+
+
+def test_data_change_invalidates_the_prefetched_frames(sales_data):
+    prefetch_store("002", week_start, [FCST_XGB_FS_KEY]).future.result()
+    end = read_df("002", end=week_start).start_time.max()
+    assert prefetch_cache.get(training_matrices_key("002", end)) is not None
+
+    mtime = sales_data.stat().st_mtime
+    os.utime(sales_data, (mtime + 10, mtime + 10))
+
+    assert prefetch_cache.get(store_df_key("002", week_start)) is None
+    assert prefetch_cache.get(training_matrices_key("002", end)) is None
+    # prefetched again for the new version of the data
+    prefetch_store("002", week_start, [FCST_XGB_FS_KEY]).future.result()
+    assert prefetch_cache.get(store_df_key("002", week_start)) is not None
+
+
+def test_cancelled_prefetch_stops_between_series(forecaster, monkeypatch):
+    loaded = []
+    monkeypatch.setattr(algo.registry, "get_cached_xgb", lambda _df, key, *args, **kwargs: loaded.append(key))
+
+    forecaster.prefetch(read_df("001", end=week_start), "001", dates, cancelled=lambda: len(loaded) >= 2)
+
+    assert len(loaded) == 2
+
+
+def test_prefetch_cache_evicts_least_recently_used():
+    cache = PrefetchCache(max_bytes=100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"
+
+    cache.put("c", "C", 40)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+
+    # larger than the cache: not kept, and nothing evicted for it
+    cache.put("d", "D", 101)
+    assert (cache.get("a"), cache.get("c"), cache.get("d")) == ("A", "C", None)
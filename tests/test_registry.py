@@ -0,0 +1,114 @@
+import datetime as dt
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import mean_absolute_error
+
+from algo import backtest
+from algo.forecast import forecast_sma
+from algo.registry import (
+    FCST_LAST_WEEK_KEY,
+    FCST_SMA_KEY,
+    FCST_XGB_KEY,
+    Forecaster,
+    SeriesForecaster,
+    forecasters,
+    register_forecaster,
+    run_forecasters,
+    run_forecasters_what_if,
+)
+from db.crud import df_parquet_path, read_df
+
+week_start = dt.date(2024, 1, 8)
+dates = [week_start + dt.timedelta(days=n) for n in range(7)]
+
+
+@pytest.fixture
+def store_df() -> pd.DataFrame:
+    return read_df("001", end=week_start)
+
+
+def test_run_forecasters(store_df):
+    keys = [FCST_SMA_KEY, FCST_LAST_WEEK_KEY]
+
+    fcst_df, timings = run_forecasters(keys, store_df, "001", dates, {"promo": 0, "pollution": 1})
+
+    assert list(fcst_df.columns) == ["start_time", "section", "indicator", *keys]
+    assert len(fcst_df) == 9 * 7 * 48
+    assert fcst_df[keys].notna().all().all()
+    assert set(timings) == set(keys)
+
+    series_df = store_df[(store_df.section == "MAINS") & (store_df.indicator == "Items")]
+    expected = forecast_sma(series_df.set_index("start_time").value, dates=dates)
+    fcst = fcst_df[(fcst_df.section == "MAINS") & (fcst_df.indicator == "Items")].set_index("start_time")
+    np.testing.assert_allclose(fcst[FCST_SMA_KEY].to_numpy(), expected.to_numpy())
+
+
+def test_run_forecasters_what_if(store_df):
+    feature_grid = [{"promo": promo, "pollution": 2} for promo in (0, 1)]
+
+    what_if_df, _ = run_forecasters_what_if([FCST_SMA_KEY, FCST_XGB_KEY], store_df, "001", dates, feature_grid)
+
+    assert len(what_if_df) == 2 * 9 * 7 * 48
+    # the SMA does not depend on the features, XGB does
+    promo_df = what_if_df.set_index(["start_time", "section", "indicator", "promo"]).unstack("promo")
+    np.testing.assert_array_equal(promo_df[FCST_SMA_KEY][0], promo_df[FCST_SMA_KEY][1])
+    assert (promo_df[FCST_XGB_KEY][0] != promo_df[FCST_XGB_KEY][1]).any()
+
+    # each combination is the forecast of run_forecasters with these features
+    fcst_df, _ = run_forecasters([FCST_XGB_KEY], store_df, "001", dates, feature_grid[1])
+    fcst = fcst_df.set_index(["start_time", "section", "indicator"])[FCST_XGB_KEY]
+    np.testing.assert_allclose(promo_df[FCST_XGB_KEY][1].loc[fcst.index].to_numpy(), fcst.to_numpy(), rtol=1e-6)
+
+
+def test_register_forecaster(store_df, monkeypatch):
+    monkeypatch.setitem(forecasters, "forecast_zero", None)
+    zero = SeriesForecaster("forecast_zero", "Zero", lambda series, dates: forecast_sma(series, 1, dates) * 0)
+    register_forecaster(zero)
+
+    fcst_df, _ = run_forecasters(["forecast_zero"], store_df, "001", dates, {})
+
+    assert (fcst_df["forecast_zero"] == 0).all()
+
+
+def test_forecaster_requires_predict_many():
+    class Untrained(Forecaster):
+        pass
+
+    with pytest.raises(TypeError, match="predict_many"):
+        Untrained("untrained", "Untrained")
+
+
+def test_xgb_options_do_not_depend_on_the_imported_modules():
+    # registered once, by algo.registry: the Taipy configuration does not replace the model
+    code = (
+        "import algo.registry as r; xgb = r.forecasters[r.FCST_XGB_KEY]; options = vars(xgb).copy(); "
+        "import tpconfig.tpconfig; assert r.forecasters[r.FCST_XGB_KEY] is xgb and vars(xgb) == options; "
+        "assert xgb.use_feature_store == r.XGB_USE_FEATURE_STORE"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent, check=True)
+
+
+def test_backtest_store_week(monkeypatch):
+    monkeypatch.setattr(backtest, "_store_dfs", {})
+    backtest._init_worker(n_threads=1)
+
+    metrics_df = backtest._backtest_store_week("002", week_start, [FCST_SMA_KEY, FCST_LAST_WEEK_KEY])
+
+    assert len(metrics_df) == 9 * 2
+    end = dates[-1] + dt.timedelta(days=1)
+    actual_df = read_df("002", section_indicator=("SIDES", "Sales"), start=week_start, end=end)
+    fcst_df, _ = run_forecasters([FCST_LAST_WEEK_KEY], read_df("002", end=week_start), "002", dates, {})
+    fcst = fcst_df[(fcst_df.section == "SIDES") & (fcst_df.indicator == "Sales")][FCST_LAST_WEEK_KEY]
+    metrics = metrics_df.set_index(["section", "indicator", "model"]).loc[("SIDES", "Sales", FCST_LAST_WEEK_KEY)]
+    assert metrics["mae"] == pytest.approx(mean_absolute_error(actual_df.value, fcst))
+    # the features that occurred in the week
+    assert metrics["promo"] == actual_df.promo.iloc[0]
+
+
+def test_backtest_metrics_are_written_to_the_data_directory():
+    assert backtest.default_output_path.parent == df_parquet_path.parent
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from db.crud import append_df
+from db.rollups import FREQ_DAY, FREQ_MONTH, FREQ_WEEK, build_rollups, read_rollup, rollups_path
+
+_bucket_freqs = {FREQ_DAY: "D", FREQ_WEEK: "W-SUN", FREQ_MONTH: "M"}
+
+
+def _groupby_sum(df: pd.DataFrame, store_id: str, freq: str) -> pd.DataFrame:
+    df = df[df.store_id == store_id].astype({"section": str, "indicator": str})
+    bucket = df.start_time.dt.to_period(_bucket_freqs[freq]).dt.start_time.rename("start_time")
+    rollup_df = df.groupby(["section", "indicator", bucket]).value.sum().reset_index()
+    return rollup_df.sort_values(["section", "indicator", "start_time"], ignore_index=True)
+
+
+def _normalize(rollup_df: pd.DataFrame) -> pd.DataFrame:
+    rollup_df = rollup_df.astype({"section": str, "indicator": str})[["section", "indicator", "start_time", "value"]]
+    return rollup_df.sort_values(["section", "indicator", "start_time"], ignore_index=True)
+
+
+@pytest.mark.parametrize("freq", [FREQ_DAY, FREQ_WEEK, FREQ_MONTH])
+def test_read_rollup_matches_groupby(sales_df, freq):
+    rollup_df = read_rollup("002", freq)
+
+    pd.testing.assert_frame_equal(_normalize(rollup_df), _groupby_sum(sales_df, "002", freq), check_dtype=False)
+
+
+@pytest.mark.parametrize("freq", [FREQ_DAY, FREQ_WEEK, FREQ_MONTH])
+@pytest.mark.parametrize("end", ["2024-01-01", "2024-01-17 13:30"])
+def test_read_rollup_until_end(sales_df, freq, end):
+    # end either on a bucket boundary, or inside the buckets of every frequency
+    end = pd.Timestamp(end)
+
+    rollup_df = read_rollup("001", freq, end=end)
+
+    expected_df = _groupby_sum(sales_df[sales_df.start_time < end], "001", freq)
+    pd.testing.assert_frame_equal(_normalize(rollup_df), expected_df, check_dtype=False)
+
+
+def test_rollups_are_updated_after_append(sales_df):
+    build_rollups()
+    # the last day of the data, appended again a week later: the last month is partial before and after
+    last_day_df = sales_df[sales_df.start_time >= sales_df.start_time.max().floor("D")]
+    new_df = last_day_df.assign(start_time=last_day_df.start_time + pd.Timedelta(weeks=1))
+
+    append_df(new_df)
+
+    all_df = pd.concat([sales_df, new_df.astype({"store_id": "category"})], ignore_index=True)
+    for freq in [FREQ_DAY, FREQ_WEEK, FREQ_MONTH]:
+        rollup_df = pd.read_parquet(rollups_path / f"{freq}.parquet", filters=[("store_id", "==", "001")])
+        pd.testing.assert_frame_equal(_normalize(rollup_df), _groupby_sum(all_df, "001", freq), check_dtype=False)
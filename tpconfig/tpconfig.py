@@ -1,12 +1,23 @@
 """Taipy configuration."""
 
 import datetime as dt
-from typing import Optional
+import functools
+from typing import Callable, Optional
 
 import pandas as pd
 from taipy import Config, Scope
 
-from algo.forecast import forecast_sma, forecast_xgb, business_features
+from algo.forecast import business_features
+from algo.prefetch import prefetch_cache, store_df_key
+from algo.registry import (
+    FCST_LAST_WEEK_KEY,
+    FCST_SMA_KEY,
+    FCST_XGB_GLOBAL_KEY,
+    FCST_XGB_KEY,
+    forecasters,
+    run_forecasters,
+    run_forecasters_what_if,
+)
 from db.crud import read_df
 from db.schema import ForecastStoreRequest
 
@@ -30,11 +41,20 @@ air_pollution_cfg = Config.configure_data_node(id="air_pollution", scope=Scope.S
 
 store_df_cfg = Config.configure_data_node(id="store_df", scope=Scope.SCENARIO)  # pd.DataFrame
 data_df_cfg = Config.configure_data_node(id="data_df", scope=Scope.SCENARIO)  # pd.DataFrame
+what_if_df_cfg = Config.configure_data_node(id="what_if_df", scope=Scope.SCENARIO)  # Optional[pd.DataFrame]
 
 # tasks
-FCST_SMA_KEY = "forecast_sma"
-FCST_LAST_WEEK_KEY = "forecast_last_week"
-FCST_XGB_KEY = "forecast_xgb"
+# models run by the scenario, each producing the column of data_df named after its key (see algo.registry)
+# e.g. [FCST_SMA_KEY, FCST_XGB_GLOBAL_KEY] fits a single XGB model per scenario instead of one per section/indicator,
+# and [FCST_SMA_KEY, FCST_XGB_KEY, FCST_XGB_GLOBAL_KEY] reports the accuracy of both XGB modes side by side
+# (the options of each model, e.g. the XGB strategy, are set where it is registered in algo.registry)
+FORECASTER_KEYS = [FCST_SMA_KEY, FCST_XGB_KEY]
+
+# with WHAT_IF_CUBE, scenarios also forecast every combination of the business inputs (promo_flag x air_pollution) with
+# the same models, so that the Create page previews the effect of the inputs without submitting a new scenario. Off by
+# default: the cube multiplies the forecasting work of every scenario by len(what_if_grid)
+WHAT_IF_CUBE = False
+what_if_grid = [{"promo": promo, "pollution": pollution} for promo in (0, 1) for pollution in range(6)]
 
 
 def tp_get_store_df(fsr: ForecastStoreRequest, cutoff_date: Optional[dt.date | dt.datetime]) -> pd.DataFrame:
@@ -42,9 +62,11 @@ def tp_get_store_df(fsr: ForecastStoreRequest, cutoff_date: Optional[dt.date | d
 
     assert fsr.dates[0] in forecast_dates and len(fsr.dates) == 7, "invalid forecast date"
 
-    df = read_df(fsr.store_id)
-    df = df.set_index("start_time")
-    df = df[df.index < pd.Timestamp(cutoff_date)].reset_index()
+    # loaded ahead of time by the Create page (see algo.prefetch), unless prefetched before the data changed
+    df = prefetch_cache.get(store_df_key(fsr.store_id, cutoff_date))
+    if df is None:
+        df = read_df(fsr.store_id, end=cutoff_date)
+    df = df[["start_time", *df.columns.drop("start_time")]]
     return df
 
 
@@ -56,44 +78,126 @@ get_store_df_task_cfg = Config.configure_task(
     skippable=True
 )
 
-def tp_generate_data_df(store_df: pd.DataFrame, fsr: ForecastStoreRequest, promo_flag: bool, air_pollution: int) -> pd.DataFrame:
-    """Convert store_df (truncated raw dataset) to data_df (in-sample forecast with true values)."""
-
-    dfs = []
-    for section_indicator, _df in store_df.groupby(by=["section", "indicator"], observed=True):
-        _df = _df.drop(columns=["store_id", "section", "indicator"])
-        _series = _df.set_index("start_time").value
-        fcst_df = forecast_sma(_series, dates=fsr.dates).to_frame(name=FCST_SMA_KEY)
-        features = {"promo": int(promo_flag), "pollution": air_pollution}
-        fcst_df[FCST_XGB_KEY] = forecast_xgb(_df, dates=fsr.dates, features=features).values
-
-        fcst_df["section"] = section_indicator[0]
-        fcst_df["indicator"] = section_indicator[1]
-
-        fcst_df = fcst_df.reset_index()
-
-        dfs.append(fcst_df)    
-
-    data_df = pd.concat(dfs, ignore_index=True)
+def tp_run_forecaster(
+    key: str,
+    store_df: pd.DataFrame,
+    fsr: ForecastStoreRequest,
+    promo_flag: Optional[bool] = None,
+    air_pollution: Optional[int] = None,
+) -> pd.DataFrame:
+    """Forecast store_df with the model of key (see algo.registry), for tp_generate_data_df.
+
+    With WHAT_IF_CUBE, the forecast covers every combination of what_if_grid (columns start_time, section, indicator,
+    promo, pollution and key), and the scenario inputs are not needed. Otherwise, it is the forecast for promo_flag and
+    air_pollution, which models that do not use the business features are run without. The seconds spent fitting and
+    predicting are kept in attrs["timings"].
+    """
+
+    if WHAT_IF_CUBE:
+        fcst_df, timings = run_forecasters_what_if([key], store_df, fsr.store_id, fsr.dates, what_if_grid)
+    else:
+        features = {} if promo_flag is None else {"promo": int(promo_flag), "pollution": int(air_pollution)}
+        fcst_df, timings = run_forecasters([key], store_df, fsr.store_id, fsr.dates, features)
+    fcst_df.attrs["timings"] = timings
+    return fcst_df
+
+
+def tp_generate_data_df(
+    fsr: ForecastStoreRequest, promo_flag: bool, air_pollution: int, *fcst_dfs: pd.DataFrame
+) -> tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """Join the forecasts of the models (tp_run_forecaster, in the order of FORECASTER_KEYS) into data_df (in-sample
+    forecast with true values).
+
+    The seconds spent fitting and predicting with each model are kept in data_df.attrs["timings"].
+
+    With WHAT_IF_CUBE, what_if_df holds the forecasts for every combination of what_if_grid (columns start_time,
+    section, indicator, promo, pollution and one column per model) and data_df is its slice for the scenario inputs.
+    Otherwise what_if_df is None.
+    """
+
+    features = {"promo": int(promo_flag), "pollution": int(air_pollution)}
+    merge_cols = ["start_time", "section", "indicator", *(features if WHAT_IF_CUBE else [])]
+    fcst_df = functools.reduce(lambda left, right: left.merge(right, on=merge_cols, how="left"), fcst_dfs)
+    timings = {key: timing for _fcst_df in fcst_dfs for key, timing in _fcst_df.attrs["timings"].items()}
+    fcst_df.attrs = {}
+
+    what_if_df = None
+    if WHAT_IF_CUBE:
+        what_if_df = fcst_df
+        what_if_df["section"] = what_if_df["section"].astype("category")
+        what_if_df["indicator"] = what_if_df["indicator"].astype("category")
+        is_scenario = (what_if_df[list(features)] == pd.Series(features)).all(axis=1)
+        data_df = what_if_df[is_scenario].drop(columns=list(features)).reset_index(drop=True)
+    else:
+        data_df = fcst_df
     data_df["section"] = data_df["section"].astype("category")
     data_df["indicator"] = data_df["indicator"].astype("category")
 
-    # merge with actual y value
-    data_df = data_df.merge(read_df(store_id=fsr.store_id), on=["start_time", "section", "indicator"], how="left")
-    data_df = data_df[["start_time", "section", "indicator", "value", FCST_SMA_KEY, FCST_XGB_KEY, *business_features]]  # reorder columns
-
-    return data_df
+    # merge with actual y value, of the forecast dates only
+    actual_df = read_df(
+        store_id=fsr.store_id,
+        start=min(fsr.dates),
+        end=max(fsr.dates) + dt.timedelta(days=1),
+        columns=["start_time", "section", "indicator", "value", *business_features],
+    )
+    data_df = data_df.merge(actual_df, on=["start_time", "section", "indicator"], how="left")
+    data_df = data_df[["start_time", "section", "indicator", "value", *FORECASTER_KEYS, *business_features]]  # reorder columns
+    data_df.attrs["timings"] = timings
+
+    return data_df, what_if_df
+
+
+# one skippable task per model, so that resubmitting a scenario only reruns the models whose inputs changed: with
+# WHAT_IF_CUBE none of them reads the scenario inputs, and otherwise only the models using the business features do
+def _run_forecaster_function(key: str) -> Callable[..., pd.DataFrame]:
+    """tp_run_forecaster bound to key, as the module-level function tp_run_<key>.
+
+    Taipy stores the function of a task by module and name, and imports it again to run the task (e.g. in a worker
+    process), so neither a functools.partial nor a lambda would do.
+    """
+
+    def run_forecaster(store_df: pd.DataFrame, fsr: ForecastStoreRequest, *business_inputs) -> pd.DataFrame:
+        return tp_run_forecaster(key, store_df, fsr, *business_inputs)
+
+    run_forecaster.__name__ = run_forecaster.__qualname__ = f"tp_run_{key}"
+    globals()[run_forecaster.__name__] = run_forecaster
+    return run_forecaster
+
+
+fcst_df_cfgs = []
+run_forecaster_task_cfgs = []
+for key in FORECASTER_KEYS:
+    fcst_df_cfg = Config.configure_data_node(id=f"{key}_df", scope=Scope.SCENARIO)  # pd.DataFrame
+    input_cfgs = [store_df_cfg, forecast_store_request_cfg]
+    if forecasters[key].uses_business_features and not WHAT_IF_CUBE:
+        input_cfgs += [promo_flag_cfg, air_pollution_cfg]
+    run_forecaster_task_cfgs.append(
+        Config.configure_task(
+            id=f"run_{key}",
+            function=_run_forecaster_function(key),
+            input=input_cfgs,
+            output=[fcst_df_cfg],
+            skippable=True,
+        )
+    )
+    fcst_df_cfgs.append(fcst_df_cfg)
 
 generate_data_df_task_cfg = Config.configure_task(
     id="generate_data_df",
     function=tp_generate_data_df,
-    input=[store_df_cfg, forecast_store_request_cfg, promo_flag_cfg, air_pollution_cfg],
-    output=[data_df_cfg],
+    input=[forecast_store_request_cfg, promo_flag_cfg, air_pollution_cfg, *fcst_df_cfgs],
+    output=[data_df_cfg, what_if_df_cfg],
+    skippable=True,
 )
 
+# with "standalone", the model tasks of a scenario run concurrently, in worker processes which do not share the
+# in-process caches of the application (dataset, models, see algo.prefetch)
+JOB_EXECUTION_MODE = "development"
+Config.configure_job_executions(mode=JOB_EXECUTION_MODE, max_nb_of_workers=len(FORECASTER_KEYS))
+
 
 # scenario
 sales_forecast_scenario_cfg = Config.configure_scenario(
     id="sales_forecast_scenario",
-    task_configs=[get_store_df_task_cfg, generate_data_df_task_cfg],
-)
\ No newline at end of file
+    task_configs=[get_store_df_task_cfg, *run_forecaster_task_cfgs, generate_data_df_task_cfg],
+)
@@ -1,5 +1,40 @@
+import contextlib
+import threading
+from pathlib import Path
+from typing import Iterator
+
 import pandas as pd
 from dateutil import tz
 
+try:
+    import fcntl
+except ImportError:  # Windows: file_lock then only serializes the threads of a process
+    fcntl = None
+
 LOCAL_TZ = tz.tzlocal()
-TIME_STEP = pd.Timedelta(minutes=30)
\ No newline at end of file
+TIME_STEP = pd.Timedelta(minutes=30)
+
+_thread_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on the file at path (created if missing), across threads and processes.
+
+    E.g. around the build of files that are derived from the sales data, which concurrent processes would otherwise
+    build at the same time.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as lock_file:
+        if fcntl is None:
+            with _thread_lock:
+                yield
+            return
+
+        # locks of separately opened files exclude each other, within a process too
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)